@@ -23,6 +23,16 @@ except ImportError:
     NAVIGATION_AVAILABLE = False
     print("Warning: Product Navigation component not available")
 
+# Decode backend responses with orjson when it is installed (the API already encodes with it)
+try:
+    import orjson
+
+    def decode_json(response):
+        return orjson.loads(response.content)
+except ImportError:
+    def decode_json(response):
+        return response.json()
+
 # MUST BE FIRST: Set page config
 st.set_page_config(
     page_title="PharmaChain - Supply Chain Monitoring",
@@ -36,6 +46,16 @@ load_dotenv()
 
 BACKEND_URL = "http://localhost:8000"
 
+# Temperature bounds (°C): cold-chain alerts, pharmacy storage range and its warning band
+COLD_CHAIN_MIN, COLD_CHAIN_MAX = 2, 8
+PHARMACY_TEMP_MIN, PHARMACY_TEMP_MAX = 20, 30
+PHARMACY_WARNING_MARGIN = 5
+# Minimum compliance rate (%) for a batch to count as compliant
+COMPLIANCE_THRESHOLD = 95
+
+# iot_data columns the dashboards read; skips id, blockchain_hash and is_alert on the wire
+READING_FIELDS = "batch_id,temperature,humidity,location,sensor_id,timestamp"
+
 if "SUPABASE_URL" not in os.environ or "SUPABASE_KEY" not in os.environ:
     st.error("⚠️ Please set SUPABASE_URL and SUPABASE_KEY environment variables")
     st.info("Add your Supabase credentials to continue using PharmaChain")
@@ -44,7 +64,12 @@ if "SUPABASE_URL" not in os.environ or "SUPABASE_KEY" not in os.environ:
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Build the client once per browser session instead of on every script rerun. It is
+# kept per session (not st.cache_resource) because sign-in stores the user's auth
+# session on the client
+if "_supabase_client" not in st.session_state:
+    st.session_state["_supabase_client"] = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = st.session_state["_supabase_client"]
 
 # Custom CSS for role-based styling
 st.markdown("""
@@ -204,30 +229,65 @@ def login_page():
                         st.warning("Please fill in all fields")
 
 def fetch_data(endpoint):
+    # Per-run memo: repeated GETs of the same endpoint within one rerun share a response
+    memo = st.session_state.setdefault("_req_memo", {})
+    if endpoint in memo:
+        return memo[endpoint]
     try:
         response = requests.get(f"{BACKEND_URL}{endpoint}", timeout=10)
         if response.status_code == 200:
-            return response.json()
+            memo[endpoint] = decode_json(response)
+            return memo[endpoint]
         else:
             return None
     except Exception as e:
         st.error(f"Error fetching data: {e}")
         return None
 
+def submit_batch_approvals(approvals):
+    """Send FDA decisions in one bulk request, falling back to one request per batch"""
+    response = requests.post(f"{BACKEND_URL}/batch/approve_bulk",
+                             json={"approvals": approvals}, timeout=30)
+    if response.status_code == 200:
+        return response.json().get("count", 0) == len(approvals)
+    if response.status_code not in (404, 405):
+        return False
+
+    # Older backend without the bulk endpoint
+    ok = True
+    for approval in approvals:
+        single = requests.post(f"{BACKEND_URL}/batch/approve", json=approval, timeout=10)
+        ok = ok and single.status_code == 200
+    return ok
+
+def parse_timestamp(value):
+    """Parse an ISO timestamp from the API, returning None if it is missing or invalid"""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
 def get_temp_status(temp):
     """Determine temperature status and color"""
-    if 20 <= temp <= 30:
+    if PHARMACY_TEMP_MIN <= temp <= PHARMACY_TEMP_MAX:
         return "normal", "🟢", "#d4edda"
-    elif (temp >= 15 and temp < 20) or (temp > 30 and temp <= 35):
+    elif PHARMACY_TEMP_MIN - PHARMACY_WARNING_MARGIN <= temp <= PHARMACY_TEMP_MAX + PHARMACY_WARNING_MARGIN:
         return "warning", "🟡", "#fff3cd"
     else:
         return "danger", "🔴", "#f8d7da"
 
+def highlight_alerts(df):
+    """Style out-of-range temperature rows for the whole frame in one pass"""
+    mask = (df['temperature'] < COLD_CHAIN_MIN) | (df['temperature'] > COLD_CHAIN_MAX)
+    styles = pd.DataFrame('', index=df.index, columns=df.columns)
+    styles.loc[mask, :] = 'background-color: #ff4444; color: white'
+    return styles
+
 def display_live_iot_metrics(role_color="#667eea"):
     """Shared component for real-time IoT metrics across all dashboards"""
     
     # Fetch latest IoT data
-    iot_data = fetch_data("/iot/data?limit=100")
+    iot_data = fetch_data(f"/iot/data?limit=100&fields={READING_FIELDS}")
     alerts_data = fetch_data("/alerts?limit=20")
     
     if iot_data and iot_data.get("data"):
@@ -288,7 +348,7 @@ def display_live_iot_metrics(role_color="#667eea"):
         if temp_status == "danger":
             st.markdown(f"""
             <div class="temp-danger">
-                🚨 <strong>CRITICAL ALERT:</strong> Temperature {temp:.1f}°C is outside safe range (20-30°C)!
+                🚨 <strong>CRITICAL ALERT:</strong> Temperature {temp:.1f}°C is outside safe range ({PHARMACY_TEMP_MIN}-{PHARMACY_TEMP_MAX}°C)!
                 Immediate action required.
             </div>
             """, unsafe_allow_html=True)
@@ -301,7 +361,7 @@ def display_live_iot_metrics(role_color="#667eea"):
         else:
             st.markdown(f"""
             <div class="temp-normal">
-                ✅ <strong>ALL SYSTEMS NORMAL:</strong> Temperature {temp:.1f}°C is within safe range (20-30°C).
+                ✅ <strong>ALL SYSTEMS NORMAL:</strong> Temperature {temp:.1f}°C is within safe range ({PHARMACY_TEMP_MIN}-{PHARMACY_TEMP_MAX}°C).
             </div>
             """, unsafe_allow_html=True)
         
@@ -326,10 +386,10 @@ def display_live_iot_metrics(role_color="#667eea"):
                 ))
             
             # Safe range indicators
-            fig_temp.add_hrect(y0=20, y1=30, fillcolor="green", opacity=0.1, 
+            fig_temp.add_hrect(y0=PHARMACY_TEMP_MIN, y1=PHARMACY_TEMP_MAX, fillcolor="green", opacity=0.1, 
                               annotation_text="Safe Range", annotation_position="top left")
-            fig_temp.add_hline(y=30, line_dash="dash", line_color="red", annotation_text="Max Safe")
-            fig_temp.add_hline(y=20, line_dash="dash", line_color="blue", annotation_text="Min Safe")
+            fig_temp.add_hline(y=PHARMACY_TEMP_MAX, line_dash="dash", line_color="red", annotation_text="Max Safe")
+            fig_temp.add_hline(y=PHARMACY_TEMP_MIN, line_dash="dash", line_color="blue", annotation_text="Min Safe")
             
             fig_temp.update_layout(
                 xaxis_title="Time",
@@ -664,7 +724,8 @@ def fda_dashboard():
                 with col3:
                     st.write(f"**Status:** {batch['status'].upper()}")
                     st.write(f"**Submitted:** {batch['created_at'][:10]}")
-                
+                    st.checkbox("Select for bulk action", key=f"sel_{batch['batch_id']}")
+
                 st.markdown("---")
                 
                 # Verify blockchain integrity
@@ -727,6 +788,40 @@ def fda_dashboard():
                                 st.error(f"Error: {str(e)}")
                         else:
                             st.warning("Please enter rejection reason")
+
+        # Bulk actions: one request for every selected batch
+        selected_ids = [b['batch_id'] for b in pending_batches["batches"] if st.session_state.get(f"sel_{b['batch_id']}")]
+
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.write(f"**{len(selected_ids)} batch(es) selected**")
+        with col2:
+            bulk_approve = st.button("✅ Approve Selected", key="bulk_approve", use_container_width=True, disabled=not selected_ids)
+        with col3:
+            bulk_reject = st.button("❌ Reject Selected", key="bulk_reject", use_container_width=True, disabled=not selected_ids)
+
+        if bulk_approve or bulk_reject:
+            missing = [batch_id for batch_id in selected_ids if not st.session_state.get(f"remarks_{batch_id}")]
+            if missing:
+                st.warning(f"Please enter remarks for: {', '.join(missing)}")
+            else:
+                approvals = [
+                    {
+                        "batch_id": batch_id,
+                        "approved": bool(bulk_approve),
+                        "fda_email": st.session_state.user_email,
+                        "remarks": st.session_state[f"remarks_{batch_id}"]
+                    }
+                    for batch_id in selected_ids
+                ]
+                try:
+                    if submit_batch_approvals(approvals):
+                        st.success(f"✅ {len(approvals)} batch(es) {'approved' if bulk_approve else 'rejected'}!")
+                        st.rerun()
+                    else:
+                        st.error("Error: some batch decisions could not be applied")
+                except Exception as e:
+                    st.error(f"Error: {str(e)}")
     else:
         st.info("✅ No pending batches for approval")
     
@@ -766,17 +861,14 @@ def fda_dashboard():
         st.subheader("Active Temperature Alerts")
         
         if alerts_data and alerts_data.get("alerts"):
-            alerts_df = pd.DataFrame(alerts_data["alerts"])
-            # Handle timestamp parsing with error handling
-            try:
-                alerts_df['timestamp'] = pd.to_datetime(alerts_df['timestamp'], errors='coerce')
-                alerts_df = alerts_df.dropna(subset=['timestamp'])
-            except Exception as e:
-                st.error(f"Error parsing timestamps: {e}")
-            
-            for idx, alert in alerts_df.iterrows():
+            # Only rendered row by row, so skip building a DataFrame
+            for idx, alert in enumerate(alerts_data["alerts"]):
+                alert_time = parse_timestamp(alert.get('timestamp'))
+                if alert_time is None:
+                    continue
+                
                 severity_color = "🔴" if alert['severity'] == "high" else "🟡"
-                with st.expander(f"{severity_color} {alert['batch_id']} - {alert['alert_type']} ({alert['timestamp'].strftime('%Y-%m-%d %H:%M')})", expanded=(idx < 3)):
+                with st.expander(f"{severity_color} {alert['batch_id']} - {alert['alert_type']} ({alert_time.strftime('%Y-%m-%d %H:%M')})", expanded=(idx < 3)):
                     col1, col2 = st.columns(2)
                     with col1:
                         st.write(f"**Batch ID:** {alert['batch_id']}")
@@ -784,7 +876,7 @@ def fda_dashboard():
                         st.write(f"**Temperature:** {alert['temperature']}°C")
                     with col2:
                         st.write(f"**Location:** {alert['location']}")
-                        st.write(f"**Time:** {alert['timestamp']}")
+                        st.write(f"**Time:** {alert_time}")
                         st.write(f"**Message:** {alert['message']}")
         else:
             st.success("✓ No active alerts. All batches within safe parameters.")
@@ -910,10 +1002,10 @@ def fda_dashboard():
             # Filter options
             col1, col2 = st.columns(2)
             with col1:
-                roles = list(set([log["role"] for log in logs]))
+                roles = list(dict.fromkeys(log["role"] for log in logs))
                 selected_role = st.selectbox("Filter by Role", ["All"] + roles)
             with col2:
-                actions = list(set([log["action"] for log in logs]))
+                actions = list(dict.fromkeys(log["action"] for log in logs))
                 selected_action = st.selectbox("Filter by Action", ["All"] + actions)
             
             # Filter logs
@@ -1089,7 +1181,7 @@ def distributor_dashboard():
                 
                 # Live IoT Data Table
                 st.markdown("### 📊 Live IoT Readings")
-                batch_detail = fetch_data(f"/iot/data/{batch['batch_id']}")
+                batch_detail = fetch_data(f"/iot/data/{batch['batch_id']}?fields={READING_FIELDS}")
                 if batch_detail and batch_detail.get("data"):
                     df = pd.DataFrame(batch_detail["data"])
                     # Handle timestamp parsing with error handling
@@ -1100,17 +1192,13 @@ def distributor_dashboard():
                         st.error(f"Error parsing timestamps: {e}")
                         continue
                     
-                    # Filter out status update records
-                    df_filtered = df[~df['sensor_id'].str.contains("STATUS_UPDATE", na=False)]
-                    
-                    # Highlight alerts
-                    def highlight_alerts(row):
-                        if row['temperature'] < 2 or row['temperature'] > 8:
-                            return ['background-color: #ff4444; color: white'] * len(row)
-                        return [''] * len(row)
+                    # Filter out status update records (sensor_id is low-cardinality, so
+                    # the prefix check runs once per category instead of once per row)
+                    df['sensor_id'] = df['sensor_id'].astype('category')
+                    df_filtered = df[~df['sensor_id'].str.startswith("STATUS_UPDATE", na=False)]
                     
                     display_df = df_filtered[['timestamp', 'temperature', 'humidity', 'location', 'sensor_id']].head(10)
-                    st.dataframe(display_df, use_container_width=True, height=300)
+                    st.dataframe(display_df.style.apply(highlight_alerts, axis=None), use_container_width=True, height=300)
                     
                     # Temperature chart
                     fig = go.Figure()
@@ -1180,13 +1268,13 @@ def pharmacy_dashboard():
         selected_batch = st.selectbox("Select Batch to Verify", batch_ids)
         
         if st.button("Verify Batch Quality", type="primary"):
-            batch_detail = fetch_data(f"/iot/data/{selected_batch}")
+            batch_detail = fetch_data(f"/iot/data/{selected_batch}?fields={READING_FIELDS}")
             
             if batch_detail and batch_detail.get("data") and len(batch_detail["data"]) > 0:
                 records = batch_detail["data"]
                 df = pd.DataFrame(records)
                 
-                temp_violations = len(df[(df['temperature'] < 2) | (df['temperature'] > 8)])
+                temp_violations = len(df[(df['temperature'] < COLD_CHAIN_MIN) | (df['temperature'] > COLD_CHAIN_MAX)])
                 total_records = len(df)
                 compliance_rate = ((total_records - temp_violations) / total_records) * 100
                 
@@ -1197,11 +1285,11 @@ def pharmacy_dashboard():
                     st.metric("Temperature Violations", temp_violations, 
                              delta_color="inverse")
                 with col3:
-                    status_emoji = "✅" if compliance_rate >= 95 else "⚠️"
+                    status_emoji = "✅" if compliance_rate >= COMPLIANCE_THRESHOLD else "⚠️"
                     st.metric("Compliance Rate", f"{compliance_rate:.1f}%", 
                              delta=f"{status_emoji}")
                 
-                if compliance_rate >= 95:
+                if compliance_rate >= COMPLIANCE_THRESHOLD:
                     st.success(f"✅ **BATCH APPROVED** - {selected_batch} meets quality standards")
                 else:
                     st.error(f"⚠️ **BATCH REJECTED** - {selected_batch} has quality issues")
@@ -1280,15 +1368,13 @@ def pharmacy_dashboard():
         selected_batch = st.selectbox("Select Batch to Verify", batch_ids)
         
         if st.button("Verify Batch Quality", type="primary"):
-            batch_detail = fetch_data(f"/iot/data/{selected_batch}")
+            # Counts are aggregated server-side; no need to pull every reading
+            batch_stats = fetch_data(f"/batch/{selected_batch}/stats?min_temp={PHARMACY_TEMP_MIN}&max_temp={PHARMACY_TEMP_MAX}")
             
-            if batch_detail and batch_detail.get("data"):
-                records = batch_detail["data"]
-                df_batch = pd.DataFrame(records)
-                
-                temp_violations = len(df_batch[(df_batch['temperature'] < 20) | (df_batch['temperature'] > 30)])
-                total_records = len(df_batch)
-                compliance_rate = ((total_records - temp_violations) / total_records) * 100 if total_records > 0 else 0
+            if batch_stats and batch_stats.get("total_records"):
+                temp_violations = batch_stats["temperature_violations"]
+                total_records = batch_stats["total_records"]
+                compliance_rate = batch_stats["compliance_rate"]
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -1296,10 +1382,10 @@ def pharmacy_dashboard():
                 with col2:
                     st.metric("Temperature Violations", temp_violations, delta_color="inverse")
                 with col3:
-                    status_emoji = "✅" if compliance_rate >= 95 else "⚠️"
+                    status_emoji = "✅" if compliance_rate >= COMPLIANCE_THRESHOLD else "⚠️"
                     st.metric("Compliance Rate", f"{compliance_rate:.1f}%", delta=f"{status_emoji}")
                 
-                if compliance_rate >= 95:
+                if compliance_rate >= COMPLIANCE_THRESHOLD:
                     st.success(f"✅ **BATCH APPROVED** - {selected_batch} meets quality standards")
                 else:
                     st.error(f"⚠️ **BATCH REJECTED** - {selected_batch} has quality issues")
@@ -1334,14 +1420,38 @@ def pharmacy_dashboard():
     else:
         st.warning("Product Navigation feature not available. Please install dependencies: pip install folium streamlit-folium polyline")
 
+def fetch_update_seq():
+    """Sequence number of the backend's last data change, or None if unavailable"""
+    try:
+        response = requests.get(f"{BACKEND_URL}/updates/latest", timeout=5)
+        if response.status_code == 200:
+            return response.json().get("seq")
+    except Exception:
+        pass
+    return None
+
 def main():
     init_session_state()
-    
+
     if not st.session_state.authenticated:
+        # Start every script run with an empty fetch memo
+        st.session_state["_req_memo"] = {}
         login_page()
     else:
-        # Auto-refresh every 5 minutes ONLY when authenticated (300000ms = 5 minutes)
-        count = st_autorefresh(interval=300000, limit=None, key="iot_refresh")
+        # Auto-refresh every minute ONLY when authenticated; the backend change counter is
+        # polled on autorefresh ticks only, and a tick refetches dashboard data only when it
+        # moved. Any other rerun (user interaction) refetches without polling
+        count = st_autorefresh(interval=60000, limit=None, key="iot_refresh")
+        refresh = True
+        if count != st.session_state.get("_refresh_count"):
+            update_seq = fetch_update_seq()
+            last_seq = st.session_state.get("_update_seq")
+            # A seq below the last one means the backend restarted its counter: refresh too
+            refresh = update_seq is None or last_seq is None or update_seq != last_seq
+            st.session_state["_update_seq"] = update_seq
+        if refresh:
+            st.session_state["_req_memo"] = {}
+        st.session_state["_refresh_count"] = count
         st.sidebar.title("PharmaChain")
         st.sidebar.markdown(f"**User:** {st.session_state.user_email}")
         st.sidebar.markdown(f"**Role:** {st.session_state.user_role}")
@@ -1372,7 +1482,7 @@ def main():
             st.sidebar.error("❌ Backend Offline")
         
         # Show auto-refresh info
-        st.sidebar.info("🔄 Auto-refresh: Every 5 min")
+        st.sidebar.info("🔄 Auto-refresh: On new data (checked every min)")
         
         st.sidebar.markdown("---")
         
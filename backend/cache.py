@@ -0,0 +1,67 @@
+"""
+In-process TTL caches
+The response cache fronts hot GET endpoints; other callers (e.g. reverse geocoding) can
+create their own TTLCache with a different size and lifetime.
+Entries expire after their TTL and the least recently used entry is evicted when full
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Set RESPONSE_CACHE=off to always hit Supabase (e.g. while testing)
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "on").lower() not in ("off", "0", "false")
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 64
+
+class TTLCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key for ttl seconds (the cache's default if not given)"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *prefixes):
+        """Drop every entry whose key tuple starts with one of the given prefixes"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in prefixes]:
+                del self._entries[key]
+
+_responses = TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+def cache_get(key):
+    """Return the cached response for key, or None if missing or expired"""
+    if not CACHE_ENABLED:
+        return None
+    return _responses.get(key)
+
+def cache_set(key, value, ttl=CACHE_TTL_SECONDS):
+    """Store a response under key for ttl seconds"""
+    if not CACHE_ENABLED:
+        return
+    _responses.set(key, value, ttl)
+
+def cache_invalidate(*endpoints):
+    """Drop every cached response belonging to one of the given endpoints"""
+    _responses.invalidate(*endpoints)
@@ -0,0 +1,140 @@
+"""
+Blockchain hashing helpers
+Records are canonicalized as sorted-key JSON and hashed with SHA-256 (or, opt-in, BLAKE3
+for new IoT readings)
+"""
+import hashlib
+import json
+import os
+import timeit
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "hex" for a text blockchain_hash column, "bytea" after migrate_blockchain_hash_bytea.sql
+HASH_STORAGE_FORMAT = os.getenv("BLOCKCHAIN_HASH_FORMAT", "hex")
+
+# Digest used for new iot_data readings. BLAKE3 hashes are stored with a "blake3:" tag so
+# verification can tell them apart from the untagged SHA-256 history; the blake3 package is an
+# optional extra (pip install ".[blake3]")
+_HASHERS = {"sha256": hashlib.sha256}
+try:
+    from blake3 import blake3
+    _HASHERS["blake3"] = blake3
+except ImportError:
+    pass
+
+def _fastest_hasher() -> str:
+    """Time each available digest on a reading-sized payload and return the quickest"""
+    payload = os.urandom(256)
+    timings = {name: min(timeit.repeat(lambda h=h: h(payload).digest(), number=2000, repeat=3))
+               for name, h in _HASHERS.items()}
+    return min(timings, key=timings.get)
+
+# "auto" picks whichever is faster on this host (SHA-256 usually wins where OpenSSL has SHA-NI)
+IOT_HASH_ALGORITHM = os.getenv("BLOCKCHAIN_HASH_ALGO", "sha256")
+if IOT_HASH_ALGORITHM == "auto":
+    IOT_HASH_ALGORITHM = "sha256" if HASH_STORAGE_FORMAT == "bytea" else _fastest_hasher()
+if IOT_HASH_ALGORITHM not in _HASHERS or (IOT_HASH_ALGORITHM != "sha256" and HASH_STORAGE_FORMAT == "bytea"):
+    # Tagged digests need the hex text column; an unknown or uninstalled algorithm falls back too
+    print(f"Warning: BLOCKCHAIN_HASH_ALGO={IOT_HASH_ALGORITHM} unavailable, using sha256")
+    IOT_HASH_ALGORITHM = "sha256"
+
+# iot_data columns covered by blockchain_hash
+HASH_FIELDS = ("batch_id", "temperature", "humidity", "location", "sensor_id", "timestamp")
+
+# json.dumps(data, sort_keys=True) builds a fresh JSONEncoder on every call; one shared
+# encoder produces the same output. orjson cannot be used: its compact separators and
+# raw UTF-8 output would change every stored hash
+_canonical_encode = json.JSONEncoder(sort_keys=True).encode
+
+def reference_hex(text: str) -> str:
+    """32-byte BLAKE2b hex digest of a plain string (audit references, status markers)
+
+    These are identifiers that are never re-verified, so they use stdlib BLAKE2b, which is
+    cheaper than SHA-256 on short inputs; the 64-char hex fits the same columns.
+    """
+    return hashlib.blake2b(text.encode(), digest_size=32).hexdigest()
+
+def canonical_bytes(data: dict) -> bytes:
+    """Serialize a record to the exact bytes its hash is computed over"""
+    return _canonical_encode(data).encode()
+
+def compute_hash(data: dict) -> str:
+    """One-shot SHA-256 hex digest of a record's canonical form"""
+    return hashlib.sha256(canonical_bytes(data)).hexdigest()
+
+# canonical_bytes() of a HASH_FIELDS dict is always these keys in sorted order, so the
+# JSON skeleton is fixed and only the six values need encoding per record
+_SORTED_HASH_FIELDS = tuple(sorted(HASH_FIELDS))
+_IOT_TEMPLATE = "{{" + ", ".join(json.dumps(k) + ": {}" for k in _SORTED_HASH_FIELDS) + "}}"
+_encode_str = json.encoder.encode_basestring_ascii
+_float_repr = float.__repr__
+
+def _encode_value(value) -> str:
+    """Encode one scalar exactly as json.dumps() would"""
+    if type(value) is str:
+        return _encode_str(value)
+    if type(value) is float and value == value and value not in (float("inf"), float("-inf")):
+        return _float_repr(value)
+    return json.dumps(value)
+
+def iot_canonical_bytes(record: dict) -> bytes:
+    """canonical_bytes() of the HASH_FIELDS of record, without building and sorting a dict"""
+    return _IOT_TEMPLATE.format(*[_encode_value(record[k]) for k in _SORTED_HASH_FIELDS]).encode()
+
+def _tag(algorithm: str, hex_digest: str) -> str:
+    return hex_digest if algorithm == "sha256" else f"{algorithm}:{hex_digest}"
+
+def hash_algorithm_of(value) -> str:
+    """Algorithm a stored blockchain_hash was produced with"""
+    if isinstance(value, str) and ":" in value[:8]:
+        return value.split(":", 1)[0]
+    return "sha256"
+
+def hash_iot_record(record: dict, algorithm: str = None) -> str:
+    """Hash an iot_data row (or reading) over HASH_FIELDS, ignoring any other columns"""
+    algorithm = algorithm or IOT_HASH_ALGORITHM
+    if algorithm not in _HASHERS:
+        raise RuntimeError(f"Cannot verify {algorithm} hashes: the {algorithm} package is not installed")
+    return _tag(algorithm, _HASHERS[algorithm](iot_canonical_bytes(record)).hexdigest())
+
+def hash_iot_records(records: list) -> list:
+    """hash_iot_record() for many rows, hashed in a single tight pass"""
+    canonical = iot_canonical_bytes
+    hasher = _HASHERS[IOT_HASH_ALGORITHM]
+    return [_tag(IOT_HASH_ALGORITHM, hasher(canonical(r)).hexdigest()) for r in records]
+
+def iot_record_digests(records: list) -> list:
+    """Raw 32-byte digests of many rows, each with the algorithm its stored blockchain_hash
+    used, for comparing against stored_digest(); None where that algorithm is unavailable
+    """
+    canonical = iot_canonical_bytes
+    digests = []
+    for r in records:
+        hasher = _HASHERS.get(hash_algorithm_of(r.get("blockchain_hash")))
+        digests.append(hasher(canonical(r)).digest() if hasher else None)
+    return digests
+
+def to_stored_hash(hex_digest: str) -> str:
+    """Encode a hex digest for the blockchain_hash column"""
+    if HASH_STORAGE_FORMAT == "bytea":
+        # PostgREST accepts bytea as "\x"-prefixed hex and stores the 32 raw bytes
+        return "\\x" + hex_digest
+    return hex_digest
+
+def from_stored_hash(value):
+    """Decode a blockchain_hash column value (text or bytea) back to its hash string"""
+    if isinstance(value, str) and value.startswith("\\x"):
+        return value[2:]
+    return value
+
+def stored_digest(value) -> bytes:
+    """Raw digest bytes of a (possibly tagged) blockchain_hash value, or b"" if missing or malformed"""
+    value = from_stored_hash(value)
+    if hash_algorithm_of(value) != "sha256":
+        value = value.split(":", 1)[1]
+    try:
+        return bytes.fromhex(value or "")
+    except (TypeError, ValueError):
+        return b""
@@ -1,21 +1,79 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, BackgroundTasks, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime
-import hashlib
+from datetime import datetime, timezone
+import hmac
 import json
 import asyncio
+import anyio
 import requests
+from urllib3.util.retry import Retry
 import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+import numpy as np
 from dotenv import load_dotenv
-from backend.supabase_config import get_supabase_client
+from postgrest.exceptions import APIError
+from backend.supabase_config import supabase
+from backend.cache import TTLCache, cache_get, cache_set, cache_invalidate
+from backend.updates import publish_update, latest_update, subscribe, unsubscribe
+from backend.write_batcher import WriteBatcher
+from backend.hashing import HASH_FIELDS, compute_hash, reference_hex, hash_iot_record, hash_iot_records, iot_record_digests, hash_algorithm_of, IOT_HASH_ALGORITHM, to_stored_hash, from_stored_hash, stored_digest
 
 # Load environment variables
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 
-app = FastAPI(title="PharmaChain API", version="1.0.0")
+# PostgREST / Postgres error codes for an RPC whose function is not installed
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+def is_missing_function(error: APIError) -> bool:
+    """True when an RPC failed only because its SQL function has not been created yet"""
+    return error.code in MISSING_FUNCTION_CODES
+
+# PostgREST / Postgres codes for a table that has not been created yet
+MISSING_TABLE_CODES = ("PGRST205", "42P01")
+
+def is_missing_table(error: APIError) -> bool:
+    """True when a query failed only because its table has not been created yet"""
+    return error.code in MISSING_TABLE_CODES
+
+def now_iso() -> str:
+    """Current UTC time as an ISO 8601 string with an explicit +00:00 offset"""
+    return datetime.now(timezone.utc).isoformat()
+
+# Cold-chain bounds (°C): readings outside SAFE raise an alert, outside CRITICAL it is high severity
+SAFE_TEMP_MIN, SAFE_TEMP_MAX = 2.0, 8.0
+CRITICAL_TEMP_MIN, CRITICAL_TEMP_MAX = 0.0, 10.0
+
+# Serialize responses with orjson when it is installed
+try:
+    import orjson
+    DefaultResponse = ORJSONResponse
+    dumps_bytes = orjson.dumps
+except ImportError:
+    DefaultResponse = JSONResponse
+    def dumps_bytes(obj):
+        return json.dumps(obj).encode()
+
+# Handlers that call Supabase or Google APIs use the blocking clients, so they are
+# declared with plain `def` and FastAPI runs them in its worker threadpool instead of
+# stalling the event loop
+app = FastAPI(title="PharmaChain API", version="1.0.0", default_response_class=DefaultResponse)
+
+# Every blocking handler holds one threadpool slot for its Supabase round-trip, so the
+# pool size (anyio defaults to 40) caps how many requests can overlap their I/O
+API_THREADPOOL_SIZE = int(os.getenv("API_THREADPOOL_SIZE", "100"))
+
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = API_THREADPOOL_SIZE
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,32 +83,78 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Route lists (encoded polylines), ledgers and reading lists compress several-fold;
+# requests advertises gzip by default and decodes it transparently
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Google Maps API Helper Functions
+# One keep-alive session for all Google calls, so repeated lookups reuse TCP/TLS connections
+# (the pool matches the handler threadpool so concurrent lookups do not queue for a socket).
+# Rate-limit and transient 5xx answers are retried twice with a short backoff; POST
+# (geolocate) is not in Retry's default methods, so only the idempotent GETs retry
+google_session = requests.Session()
+google_session.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=API_THREADPOOL_SIZE,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])
+))
+
+# Query values go through params= so requests percent-encodes them (addresses contain
+# spaces, '&' and '#') instead of being pasted into the URL
+GEOLOCATE_URL = "https://www.googleapis.com/geolocation/v1/geolocate"
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+DIRECTIONS_URL = "https://maps.googleapis.com/maps/api/directions/json"
+
+# Extra threads for handlers that issue independent Google lookups side by side
+google_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="google")
+
+# The Geolocation API locates this server, which does not move between readings
+server_location = TTLCache(max_entries=1, ttl=600)
+# Held while a lookup is in flight, so a burst of Auto-Detected readings makes one
+# API call and the rest read its result from the cache
+server_location_lock = threading.Lock()
+
 def get_coordinates():
     """Fetch approximate coordinates using Google Geolocation API"""
     if not GOOGLE_API_KEY:
         return None, None
+    cached = server_location.get("coordinates")
+    if cached is not None:
+        return cached
+    with server_location_lock:
+        cached = server_location.get("coordinates")
+        if cached is not None:
+            return cached
+        return fetch_coordinates()
+
+def fetch_coordinates():
     try:
-        res = requests.post(
-            f"https://www.googleapis.com/geolocation/v1/geolocate?key={GOOGLE_API_KEY}",
-            timeout=5
-        )
+        res = google_session.post(GEOLOCATE_URL, params={"key": GOOGLE_API_KEY}, timeout=5)
         data = res.json()
         if "location" in data:
-            return data["location"]["lat"], data["location"]["lng"]
-        return None, None
+            coordinates = data["location"]["lat"], data["location"]["lng"]
+            server_location.set("coordinates", coordinates)
+            return coordinates
     except:
-        return None, None
+        pass
+    # Remember the failure briefly so callers queued on the lock don't each wait out a timeout
+    server_location.set("coordinates", (None, None), ttl=30)
+    return None, None
+
+# Reverse-geocoded addresses keyed by coordinates rounded to 4 decimals (~11 m), so
+# readings from the same site share one Geocoding API call per day
+place_names = TTLCache(max_entries=10000, ttl=86400)
 
 def get_place_name(lat, lng):
     """Convert coordinates into a readable address using Geocoding API"""
     if not GOOGLE_API_KEY:
         return f"Location ({lat:.4f}, {lng:.4f})"
+    key = (round(lat, 4), round(lng, 4))
+    cached = place_names.get(key)
+    if cached is not None:
+        return cached
     try:
-        res = requests.get(
-            f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lng}&key={GOOGLE_API_KEY}",
-            timeout=5
-        )
+        res = google_session.get(GEOCODE_URL, params={"latlng": f"{lat},{lng}", "key": GOOGLE_API_KEY}, timeout=5)
         data = res.json()
         
         # Check for API errors
@@ -59,7 +163,9 @@ def get_place_name(lat, lng):
             return f"Location ({lat:.4f}, {lng:.4f}) - Enable Geocoding API"
         
         if data.get("results"):
-            return data["results"][0]["formatted_address"]
+            address = data["results"][0]["formatted_address"]
+            place_names.set(key, address)
+            return address
         
         # Fallback with coordinates
         return f"Location ({lat:.4f}, {lng:.4f})"
@@ -72,18 +178,18 @@ def get_route_directions(origin, destination):
     if not GOOGLE_API_KEY:
         return {"error": "Google API key not configured"}
     try:
-        url = f"https://maps.googleapis.com/maps/api/directions/json?origin={origin}&destination={destination}&key={GOOGLE_API_KEY}"
-        res = requests.get(url, timeout=10)
+        res = google_session.get(DIRECTIONS_URL, params={"origin": origin, "destination": destination, "key": GOOGLE_API_KEY}, timeout=10)
         return res.json()
     except:
         return {"error": "Failed to fetch route"}
 
 class IoTData(BaseModel):
-    batch_id: str
-    temperature: float
-    humidity: float
+    # Physically impossible readings are rejected at validation, before hashing or storage
+    batch_id: str = Field(min_length=1, max_length=64)
+    temperature: float = Field(ge=-50, le=100)
+    humidity: float = Field(ge=0, le=100)
     location: str
-    sensor_id: str
+    sensor_id: str = Field(min_length=1)
     timestamp: Optional[str] = None
 
 class BlockchainVerification(BaseModel):
@@ -109,6 +215,9 @@ class BatchApproval(BaseModel):
     fda_email: str
     remarks: str
 
+class BatchApprovalBulk(BaseModel):
+    approvals: List[BatchApproval]
+
 class LedgerEntry(BaseModel):
     batch_id: str
     event: str
@@ -137,68 +246,127 @@ async def root():
         ]
     }
 
-@app.post("/iot/data")
-async def receive_iot_data(data: IoTData):
+def write_alert(alert_data):
+    """Store a temperature alert (or a list of them) in alerts and alerts_log"""
     try:
-        supabase = get_supabase_client()
+        supabase.table("alerts").insert(alert_data).execute()
+        
+        # Also log to alerts_log for real-time tracking
+        try:
+            supabase.table("alerts_log").insert(alert_data).execute()
+        except:
+            pass
         
+        cache_invalidate("/alerts")
+        publish_update("alert")
+    except Exception as e:
+        print(f"Alert write error: {str(e)}")
+
+def resolve_location(location: str) -> str:
+    """Replace "Auto-Detected" with the address reported by the Google APIs"""
+    if location != "Auto-Detected":
+        return location
+    
+    if GOOGLE_API_KEY:
+        lat, lng = get_coordinates()
+        if lat and lng:
+            address = get_place_name(lat, lng)
+            # Only add coordinates if address doesn't already contain them
+            if "(" not in address:
+                return f"{address} ({lat:.4f}, {lng:.4f})"
+            return address
+        # Fallback when API call fails
+        return "Location Detection Failed (Check API Key)"
+    # Fallback when API key is not configured
+    return "Auto-Detection Disabled (Configure GOOGLE_API_KEY)"
+
+def build_iot_record(data: IoTData, location: str) -> dict:
+    """Build the iot_data row (hashed fields only) for a reading"""
+    return {
+        "batch_id": data.batch_id,
+        "temperature": data.temperature,
+        "humidity": data.humidity,
+        "location": location,  # Use processed location
+        "sensor_id": data.sensor_id,
+        "timestamp": data.timestamp
+    }
+
+def build_alert(data: IoTData, severity: str) -> dict:
+    """Build the alerts row for an out-of-range reading"""
+    return {
+        "batch_id": data.batch_id,
+        "alert_type": "Temperature Out of Range",
+        "severity": severity,
+        "message": f"Temperature {data.temperature}°C is outside safe range ({SAFE_TEMP_MIN:g}-{SAFE_TEMP_MAX:g}°C)",
+        "timestamp": data.timestamp,
+        "temperature": data.temperature,
+        "location": data.location
+    }
+
+def on_iot_rows_written(rows: list):
+    cache_invalidate("/iot/data", "/iot/aggregate", "/batches")
+    batch_ids = {r["batch_id"] for r in rows}
+    publish_update("iot_data", batch_ids.pop() if len(batch_ids) == 1 else None)
+
+# With IOT_WRITE_BATCHING=on, in-range readings are acknowledged once queued and written
+# in bulk inserts of up to 256 rows / 200 ms; readings that raise an alert are always
+# written before responding
+IOT_WRITE_BATCHING = os.getenv("IOT_WRITE_BATCHING", "off").lower() in ("on", "1", "true")
+iot_batcher = WriteBatcher(lambda rows: supabase.table("iot_data").insert(rows).execute(), on_flush=on_iot_rows_written, name="iot-write-batcher")
+
+@app.on_event("shutdown")
+def flush_iot_batcher():
+    iot_batcher.flush()
+
+@app.post("/iot/data")
+def receive_iot_data(data: IoTData, background_tasks: BackgroundTasks):
+    try:
         if not data.timestamp:
-            data.timestamp = datetime.utcnow().isoformat()
+            data.timestamp = now_iso()
         
         # Auto-detect location if "Auto-Detected" is sent
-        location = data.location
-        if location == "Auto-Detected":
-            if GOOGLE_API_KEY:
-                lat, lng = get_coordinates()
-                if lat and lng:
-                    address = get_place_name(lat, lng)
-                    # Only add coordinates if address doesn't already contain them
-                    if "(" not in address:
-                        location = f"{address} ({lat:.4f}, {lng:.4f})"
-                    else:
-                        location = address
-                else:
-                    # Fallback when API call fails
-                    location = "Location Detection Failed (Check API Key)"
-            else:
-                # Fallback when API key is not configured
-                location = "Auto-Detection Disabled (Configure GOOGLE_API_KEY)"
-        
-        data_dict = {
-            "batch_id": data.batch_id,
-            "temperature": data.temperature,
-            "humidity": data.humidity,
-            "location": location,  # Use processed location
-            "sensor_id": data.sensor_id,
-            "timestamp": data.timestamp
-        }
+        location = resolve_location(data.location)
         
-        data_string = json.dumps(data_dict, sort_keys=True)
-        blockchain_hash = hashlib.sha256(data_string.encode()).hexdigest()
-        data_dict["blockchain_hash"] = blockchain_hash
+        data_dict = build_iot_record(data, location)
+        blockchain_hash = hash_iot_record(data_dict)
+        data_dict["blockchain_hash"] = to_stored_hash(blockchain_hash)
         
-        is_alert = data.temperature < 2.0 or data.temperature > 8.0
+        is_alert = data.temperature < SAFE_TEMP_MIN or data.temperature > SAFE_TEMP_MAX
         data_dict["is_alert"] = is_alert
         
-        result = supabase.table("iot_data").insert(data_dict).execute()
-        
+        stored = None
         if is_alert:
-            alert_data = {
-                "batch_id": data.batch_id,
-                "alert_type": "Temperature Out of Range",
-                "severity": "high" if (data.temperature < 0 or data.temperature > 10) else "medium",
-                "message": f"Temperature {data.temperature}°C is outside safe range (2-8°C)",
-                "timestamp": data.timestamp,
-                "temperature": data.temperature,
-                "location": data.location
-            }
-            supabase.table("alerts").insert(alert_data).execute()
-            
-            # Also log to alerts_log for real-time tracking
+            severity = "high" if (data.temperature < CRITICAL_TEMP_MIN or data.temperature > CRITICAL_TEMP_MAX) else "medium"
+            alert = build_alert(data, severity)
+            # Reading and alert in one round-trip when insert_iot_with_alert() exists
+            # (create_insert_iot_with_alert_function.sql)
             try:
-                supabase.table("alerts_log").insert(alert_data).execute()
-            except:
-                pass
+                stored = supabase.rpc("insert_iot_with_alert", {"p_reading": data_dict, "p_alert": alert}).execute().data
+                cache_invalidate("/alerts")
+                publish_update("alert")
+            except APIError as e:
+                # A timeout or other failure may come after the RPC committed, so only a
+                # missing function falls back to the plain insert (no double write)
+                if not is_missing_function(e):
+                    raise
+                result = supabase.table("iot_data").insert(data_dict).execute()
+                stored = result.data[0] if result.data else None
+                # The sensor only needs the reading acknowledged; write the alert after responding
+                background_tasks.add_task(write_alert, alert)
+        elif IOT_WRITE_BATCHING:
+            iot_batcher.put(data_dict)
+            return {
+                "status": "success",
+                "message": "IoT data received and queued for storage",
+                "blockchain_hash": blockchain_hash,
+                "alert_generated": False,
+                "data": None
+            }
+        else:
+            result = supabase.table("iot_data").insert(data_dict).execute()
+            stored = result.data[0] if result.data else None
+        
+        on_iot_rows_written([data_dict])
         
         # Skip ledger logging for IoT readings to prevent timeout
         # Ledger is still used for important events (batch creation, approval, etc.)
@@ -207,65 +375,221 @@ async def receive_iot_data(data: IoTData):
             "status": "success",
             "message": "IoT data received and stored",
             "blockchain_hash": blockchain_hash,
-            "alert_generated": is_alert,
-            "data": result.data[0] if result.data else None
+            "alert_generated": data_dict["is_alert"],
+            "data": stored
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/iot/data/bulk")
+def receive_iot_data_bulk(readings: List[IoTData], background_tasks: BackgroundTasks):
+    """Store many IoT readings with one iot_data insert"""
+    try:
+        if not readings:
+            return {"status": "success", "message": "No readings received", "count": 0, "alerts_generated": 0, "alert_flags": [], "blockchain_hashes": []}
+        
+        now = now_iso()
+        
+        # Auto-detection describes this server's location, so resolve it once per request
+        resolved = {}
+        records = []
+        for data in readings:
+            if not data.timestamp:
+                data.timestamp = now
+            if data.location not in resolved:
+                resolved[data.location] = resolve_location(data.location)
+            records.append(build_iot_record(data, resolved[data.location]))
+        
+        # Classify the whole batch with array comparisons instead of per-row branches
+        temps = np.fromiter((data.temperature for data in readings), dtype=np.float64, count=len(readings))
+        alert_mask = (temps < SAFE_TEMP_MIN) | (temps > SAFE_TEMP_MAX)
+        severities = np.where((temps < CRITICAL_TEMP_MIN) | (temps > CRITICAL_TEMP_MAX), "high", "medium")
+        
+        # Hash every record in one pass, then attach the derived columns
+        blockchain_hashes = hash_iot_records(records)
+        for data_dict, is_alert, blockchain_hash in zip(records, alert_mask.tolist(), blockchain_hashes):
+            data_dict["blockchain_hash"] = to_stored_hash(blockchain_hash)
+            data_dict["is_alert"] = is_alert
+        
+        alerts = [build_alert(readings[i], str(severities[i])) for i in np.flatnonzero(alert_mask)]
+        
+        supabase.table("iot_data").insert(records).execute()
+        
+        if alerts:
+            background_tasks.add_task(write_alert, alerts)
+        
+        on_iot_rows_written(records)
+        
+        return {
+            "status": "success",
+            "message": f"{len(records)} IoT readings received and stored",
+            "count": len(records),
+            "alerts_generated": len(alerts),
+            "alert_flags": alert_mask.tolist(),
+            "blockchain_hashes": blockchain_hashes
         }
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+IOT_COLUMNS = ("id", "batch_id", "temperature", "humidity", "location", "sensor_id", "timestamp", "blockchain_hash", "is_alert")
+
+def select_columns(fields: Optional[str], allowed: tuple) -> str:
+    """PostgREST select list for a comma-separated ?fields= projection (all columns if omitted)"""
+    if not fields:
+        return "*"
+    columns = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [c for c in columns if c not in allowed]
+    if unknown or not columns:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(allowed)}")
+    return ",".join(columns)
+
+def wants_ndjson(request: Request) -> bool:
+    """True when the client asked for newline-delimited JSON rows instead of one document"""
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+def ndjson_response(rows) -> StreamingResponse:
+    """Stream rows (any iterable of dicts) as one JSON object per line"""
+    return StreamingResponse((dumps_bytes(row) + b"\n" for row in rows), media_type="application/x-ndjson")
+
+def iter_pages(query, page_size: int = 1000):
+    """Yield rows from an ordered Supabase query one range()-page at a time"""
+    offset = 0
+    while True:
+        page = query.range(offset, offset + page_size - 1).execute().data
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
 @app.get("/iot/data")
-async def get_all_iot_data(limit: int = 100):
+def get_all_iot_data(request: Request, limit: int = 100, fields: Optional[str] = None, after_id: Optional[int] = None):
+    """Newest readings, or with after_id only the rows stored since then (oldest first) for delta polling"""
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("iot_data").select("*").order("timestamp", desc=True).limit(limit).execute()
-        return {"status": "success", "data": result.data, "count": len(result.data)}
+        columns = select_columns(fields, IOT_COLUMNS)
+        cached = cache_get(("/iot/data", limit, columns, after_id))
+        if cached is not None:
+            return ndjson_response(cached["data"]) if wants_ndjson(request) else cached
+        
+        query = supabase.table("iot_data").select(columns)
+        if after_id is None:
+            query = query.order("timestamp", desc=True)
+        else:
+            # ids follow insertion order, so late uploads with old timestamps are not skipped
+            query = query.gt("id", after_id).order("id")
+        result = query.limit(limit).execute()
+        if wants_ndjson(request):
+            return ndjson_response(result.data)
+        response = {"status": "success", "data": result.data, "count": len(result.data)}
+        cache_set(("/iot/data", limit, columns, after_id), response)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/iot/data/{batch_id}")
-async def get_batch_data(batch_id: str):
+def get_batch_data(batch_id: str, response: Response, offset: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000), fields: Optional[str] = None):
+    """Newest-first readings for a batch, one page at a time"""
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("iot_data").select("*").eq("batch_id", batch_id).order("timestamp", desc=True).execute()
-        return {"status": "success", "batch_id": batch_id, "data": result.data, "count": len(result.data)}
+        columns = select_columns(fields, IOT_COLUMNS)
+        result = supabase.table("iot_data").select(columns).eq("batch_id", batch_id).order("timestamp", desc=True).range(offset, offset + limit - 1).execute()
+        
+        # A full page means there may be more; point the client at the next one
+        next_offset = offset + limit if len(result.data) == limit else None
+        if next_offset is not None:
+            fields_param = f"&fields={fields}" if fields else ""
+            response.headers["Link"] = f'</iot/data/{batch_id}?offset={next_offset}&limit={limit}{fields_param}>; rel="next"'
+        
+        return {"status": "success", "batch_id": batch_id, "data": result.data, "count": len(result.data), "offset": offset, "next_offset": next_offset}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+AGGREGATE_BUCKETS = {"1m": 60, "5m": 300, "1h": 3600}
+AGGREGATE_FIELDS = ("temperature", "humidity")
+
+def aggregate_readings(rows: list, bucket_seconds: int) -> list:
+    """Group raw readings into per-batch buckets with min/avg/max, matching the iot_aggregate rows"""
+    groups = defaultdict(lambda: {f: [] for f in AGGREGATE_FIELDS})
+    for row in rows:
+        ts = datetime.fromisoformat(row["timestamp"])
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        start = int(ts.timestamp()) // bucket_seconds * bucket_seconds
+        group = groups[(row["batch_id"], start)]
+        for field in AGGREGATE_FIELDS:
+            group[field].append(row[field])
+
+    series = []
+    for (batch_id, start), group in sorted(groups.items(), key=lambda item: (item[0][1], item[0][0])):
+        entry = {"batch_id": batch_id, "bucket": datetime.fromtimestamp(start, timezone.utc).isoformat(), "readings": len(group["temperature"])}
+        for field in AGGREGATE_FIELDS:
+            values = group[field]
+            entry[f"{field}_avg"] = sum(values) / len(values)
+            entry[f"{field}_min"] = min(values)
+            entry[f"{field}_max"] = max(values)
+        series.append(entry)
+    return series
+
+@app.get("/iot/aggregate")
+def get_iot_aggregate(batch_id: Optional[str] = None, bucket: str = Query("5m", pattern="^(1m|5m|1h)$"), hours: int = Query(24, ge=1, le=720)):
+    """Min/avg/max temperature and humidity per batch and time bucket over the last `hours`"""
+    try:
+        cached = cache_get(("/iot/aggregate", batch_id, bucket, hours))
+        if cached is not None:
+            return cached
+
+        bucket_seconds = AGGREGATE_BUCKETS[bucket]
+        since = datetime.fromtimestamp(datetime.now(timezone.utc).timestamp() - hours * 3600, timezone.utc).isoformat()
+        try:
+            # create_iot_aggregate_function.sql
+            series = supabase.rpc("iot_aggregate", {"bid": batch_id, "bucket_seconds": bucket_seconds, "since": since}).execute().data
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            # Function not installed - bucket the raw readings here
+            query = supabase.table("iot_data").select("batch_id, temperature, humidity, timestamp").gte("timestamp", since)
+            if batch_id:
+                query = query.eq("batch_id", batch_id)
+            series = aggregate_readings(list(iter_pages(query.order("timestamp"))), bucket_seconds)
+
+        response = {"status": "success", "bucket": bucket, "hours": hours, "series": series, "count": len(series)}
+        cache_set(("/iot/aggregate", batch_id, bucket, hours), response)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/alerts")
-async def get_alerts(limit: int = 50):
+def get_alerts(limit: int = 50):
     try:
-        supabase = get_supabase_client()
+        cached = cache_get(("/alerts", limit))
+        if cached is not None:
+            return cached
+        
         result = supabase.table("alerts").select("*").order("timestamp", desc=True).limit(limit).execute()
-        return {"status": "success", "alerts": result.data, "count": len(result.data)}
+        response = {"status": "success", "alerts": result.data, "count": len(result.data)}
+        cache_set(("/alerts", limit), response)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/verify")
-async def verify_blockchain_hash(verification: BlockchainVerification):
+def verify_blockchain_hash(verification: BlockchainVerification):
     try:
-        supabase = get_supabase_client()
         result = supabase.table("iot_data").select("*").eq("id", verification.record_id).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Record not found")
         
         record = result.data[0]
-        stored_hash = record.get("blockchain_hash")
-        
-        data_dict = {
-            "batch_id": record["batch_id"],
-            "temperature": record["temperature"],
-            "humidity": record["humidity"],
-            "location": record["location"],
-            "sensor_id": record["sensor_id"],
-            "timestamp": record["timestamp"]
-        }
+        stored_hash = from_stored_hash(record.get("blockchain_hash"))
         
-        data_string = json.dumps(data_dict, sort_keys=True)
-        calculated_hash = hashlib.sha256(data_string.encode()).hexdigest()
+        calculated_hash = hash_iot_record(record, hash_algorithm_of(stored_hash))
         
-        is_valid = stored_hash == calculated_hash
+        is_valid = hmac.compare_digest(stored_digest(stored_hash), stored_digest(calculated_hash))
         
         return {
             "status": "success",
@@ -283,58 +607,67 @@ async def verify_blockchain_hash(verification: BlockchainVerification):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/batches")
-async def get_all_batches():
+def get_all_batches():
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("iot_data").select("batch_id").execute()
-        
-        unique_batches = list(set([item["batch_id"] for item in result.data]))
-        
-        batch_info = []
-        for batch_id in unique_batches:
-            batch_result = supabase.table("iot_data").select("*").eq("batch_id", batch_id).order("timestamp", desc=True).execute()
-            if batch_result.data:
-                latest = batch_result.data[0]
-                batch_info.append({
-                    "batch_id": batch_id,
-                    "latest_temperature": latest["temperature"],
-                    "latest_humidity": latest["humidity"],
-                    "location": latest["location"],
-                    "last_update": latest["timestamp"],
-                    "record_count": len(batch_result.data)
-                })
-        
-        return {"status": "success", "batches": batch_info, "count": len(batch_info)}
+        cached = cache_get(("/batches",))
+        if cached is not None:
+            return cached
+        
+        try:
+            # Single round-trip: latest reading + record count per batch (create_batch_summaries_function.sql)
+            result = supabase.rpc("get_batch_summaries").execute()
+            batch_info = result.data or []
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            # Function not installed - build the summaries from one ordered scan instead of one query per batch
+            # Paged so PostgREST's max-rows cap cannot silently truncate the record counts
+            rows = iter_pages(supabase.table("iot_data").select("batch_id, temperature, humidity, location, timestamp").order("timestamp", desc=True))
+            
+            summaries = {}
+            for record in rows:
+                summary = summaries.get(record["batch_id"])
+                if summary is None:
+                    summaries[record["batch_id"]] = {
+                        "batch_id": record["batch_id"],
+                        "latest_temperature": record["temperature"],
+                        "latest_humidity": record["humidity"],
+                        "location": record["location"],
+                        "last_update": record["timestamp"],
+                        "record_count": 1
+                    }
+                else:
+                    summary["record_count"] += 1
+            batch_info = list(summaries.values())
+        
+        response = {"status": "success", "batches": batch_info, "count": len(batch_info)}
+        cache_set(("/batches",), response)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/batch/status")
-async def update_batch_status(status_update: BatchStatusUpdate):
+def update_batch_status(status_update: BatchStatusUpdate):
     try:
-        supabase = get_supabase_client()
-        
-        # Check if batch_status table exists, if not use a metadata approach
-        # For now, we'll store status in a separate table or use iot_data metadata
-        
-        # Get the latest record for this batch
-        result = supabase.table("iot_data").select("*").eq("batch_id", status_update.batch_id).order("timestamp", desc=True).limit(1).execute()
-        
-        if not result.data:
+        exists = supabase.table("iot_data").select("id").eq("batch_id", status_update.batch_id).limit(1).execute()
+        if not exists.data:
             raise HTTPException(status_code=404, detail="Batch not found")
         
-        # Insert a status update record (we'll use iot_data with a special marker)
-        status_record = {
-            "batch_id": status_update.batch_id,
-            "temperature": result.data[0]["temperature"],
-            "humidity": result.data[0]["humidity"],
-            "location": f"Status: {status_update.status}",
-            "sensor_id": f"STATUS_UPDATE_BY_{status_update.updated_by}",
-            "timestamp": datetime.utcnow().isoformat(),
-            "blockchain_hash": hashlib.sha256(f"{status_update.batch_id}{status_update.status}".encode()).hexdigest(),
-            "is_alert": False
-        }
-        
-        supabase.table("iot_data").insert(status_record).execute()
+        # One upsert when the batch_status table exists (create_batch_status_table.sql)
+        try:
+            supabase.table("batch_status").upsert({
+                "batch_id": status_update.batch_id,
+                "status": status_update.status,
+                "updated_by": status_update.updated_by,
+                "updated_at": now_iso()
+            }).execute()
+        except APIError as e:
+            if not is_missing_table(e):
+                raise
+            write_status_marker(status_update)
+        
+        cache_invalidate("/iot/data", "/iot/aggregate", "/batches")
+        publish_update("batch_status", status_update.batch_id)
         
         return {
             "status": "success",
@@ -348,29 +681,55 @@ async def update_batch_status(status_update: BatchStatusUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def write_status_marker(status_update: BatchStatusUpdate):
+    """Record a status change as a marker row in iot_data (before batch_status existed)"""
+    # Get the latest record for this batch
+    result = supabase.table("iot_data").select("*").eq("batch_id", status_update.batch_id).order("timestamp", desc=True).limit(1).execute()
+    
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    # Insert a status update record (we'll use iot_data with a special marker)
+    status_record = {
+        "batch_id": status_update.batch_id,
+        "temperature": result.data[0]["temperature"],
+        "humidity": result.data[0]["humidity"],
+        "location": f"Status: {status_update.status}",
+        "sensor_id": f"STATUS_UPDATE_BY_{status_update.updated_by}",
+        "timestamp": now_iso(),
+        "blockchain_hash": to_stored_hash(reference_hex(f"{status_update.batch_id}{status_update.status}")),
+        "is_alert": False
+    }
+    
+    supabase.table("iot_data").insert(status_record).execute()
+
 @app.get("/batch/{batch_id}/status")
-async def get_batch_status(batch_id: str):
+def get_batch_status(batch_id: str):
     try:
-        supabase = get_supabase_client()
-        
-        # Look for status update records
-        result = supabase.table("iot_data").select("*").eq("batch_id", batch_id).order("timestamp", desc=True).execute()
+        # Count rows server-side; only the Content-Range total comes back
+        count_result = supabase.table("iot_data").select("id", count="exact").eq("batch_id", batch_id).limit(1).execute()
         
-        if not result.data:
+        if not count_result.count:
             raise HTTPException(status_code=404, detail="Batch not found")
         
-        # Find the latest status update
         current_status = "Created"
-        for record in result.data:
-            if "Status:" in record.get("location", ""):
-                current_status = record["location"].replace("Status: ", "")
-                break
+        try:
+            status_result = supabase.table("batch_status").select("status").eq("batch_id", batch_id).limit(1).execute()
+            if status_result.data:
+                current_status = status_result.data[0]["status"]
+        except APIError as e:
+            if not is_missing_table(e):
+                raise
+            # No batch_status table yet: fetch just the latest status marker record
+            status_result = supabase.table("iot_data").select("location").eq("batch_id", batch_id).like("location", "Status:%").order("timestamp", desc=True).limit(1).execute()
+            if status_result.data:
+                current_status = status_result.data[0]["location"].replace("Status: ", "")
         
         return {
             "status": "success",
             "batch_id": batch_id,
             "current_status": current_status,
-            "total_records": len(result.data)
+            "total_records": count_result.count
         }
     
     except HTTPException:
@@ -378,39 +737,57 @@ async def get_batch_status(batch_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/batch/{batch_id}/stats")
+def get_batch_stats(batch_id: str, min_temp: float = SAFE_TEMP_MIN, max_temp: float = SAFE_TEMP_MAX):
+    """Temperature compliance counts for a batch, aggregated in Postgres"""
+    try:
+        try:
+            # create_batch_stats_function.sql
+            result = supabase.rpc("batch_stats", {"bid": batch_id, "min_temp": min_temp, "max_temp": max_temp}).execute()
+            stats = result.data[0] if result.data else {"total_records": 0, "temperature_violations": 0}
+            total_records = stats["total_records"]
+            temp_violations = stats["temperature_violations"]
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            # Function not installed - count from the temperature column only, paged so
+            # PostgREST's max-rows does not cut large batches short
+            temperatures = [r["temperature"] for r in iter_pages(supabase.table("iot_data").select("temperature").eq("batch_id", batch_id).order("id"))]
+            total_records = len(temperatures)
+            temp_violations = sum(1 for t in temperatures if not min_temp <= t <= max_temp)
+        
+        return {
+            "status": "success",
+            "batch_id": batch_id,
+            "total_records": total_records,
+            "temperature_violations": temp_violations,
+            "compliance_rate": ((total_records - temp_violations) / total_records * 100) if total_records > 0 else 0
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+VERIFY_COLUMNS = ", ".join(HASH_FIELDS + ("blockchain_hash",))
+
 @app.post("/verify/batch/{batch_id}")
-async def verify_batch_integrity(batch_id: str):
+def verify_batch_integrity(batch_id: str):
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("iot_data").select("*").eq("batch_id", batch_id).execute()
+        # Only the hashed columns, paged so long batches are verified in full
+        rows = list(iter_pages(supabase.table("iot_data").select(VERIFY_COLUMNS).eq("batch_id", batch_id).order("id")))
         
-        if not result.data:
+        if not rows:
             raise HTTPException(status_code=404, detail="Batch not found")
         
-        total_records = len(result.data)
+        total_records = len(rows)
         valid_records = 0
         invalid_records = 0
         
-        for record in result.data:
-            stored_hash = record.get("blockchain_hash")
-            
-            # Skip status update records
-            if "STATUS_UPDATE" in record.get("sensor_id", ""):
-                continue
-            
-            data_dict = {
-                "batch_id": record["batch_id"],
-                "temperature": record["temperature"],
-                "humidity": record["humidity"],
-                "location": record["location"],
-                "sensor_id": record["sensor_id"],
-                "timestamp": record["timestamp"]
-            }
-            
-            data_string = json.dumps(data_dict, sort_keys=True)
-            calculated_hash = hashlib.sha256(data_string.encode()).hexdigest()
-            
-            if stored_hash == calculated_hash:
+        # Skip status update records, then hash the remaining readings in one pass
+        readings = [r for r in rows if "STATUS_UPDATE" not in r.get("sensor_id", "")]
+        calculated_digests = iot_record_digests(readings)
+        
+        for record, calculated_digest in zip(readings, calculated_digests):
+            if calculated_digest is not None and hmac.compare_digest(stored_digest(record.get("blockchain_hash")), calculated_digest):
                 valid_records += 1
             else:
                 invalid_records += 1
@@ -434,10 +811,8 @@ async def verify_batch_integrity(batch_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/batch/create")
-async def create_batch(batch: BatchCreate):
+def create_batch(batch: BatchCreate, background_tasks: BackgroundTasks):
     try:
-        supabase = get_supabase_client()
-        
         batch_data = {
             "batch_id": batch.batch_id,
             "manufacturer_email": batch.manufacturer_email,
@@ -451,8 +826,9 @@ async def create_batch(batch: BatchCreate):
         
         result = supabase.table("batches").insert(batch_data).execute()
         
-        # Log to audit trail
-        log_audit(
+        # Log to audit trail after responding
+        background_tasks.add_task(
+            log_audit,
             user_email=batch.manufacturer_email,
             role="Manufacturer",
             action="Created Batch",
@@ -473,6 +849,9 @@ async def create_batch(batch: BatchCreate):
             data=batch_data
         )
         
+        cache_invalidate("/batch/pending", "/batch/all", "/batch/details")
+        publish_update("batch", batch.batch_id)
+        
         return {
             "status": "success",
             "message": f"Batch {batch.batch_id} created and pending FDA approval",
@@ -483,74 +862,95 @@ async def create_batch(batch: BatchCreate):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/batch/pending")
-async def get_pending_batches():
+def get_pending_batches():
     try:
-        supabase = get_supabase_client()
+        cached = cache_get(("/batch/pending",))
+        if cached is not None:
+            return cached
+        
         result = supabase.table("batches").select("*").eq("status", "pending").order("created_at", desc=True).execute()
-        return {"status": "success", "batches": result.data, "count": len(result.data)}
+        response = {"status": "success", "batches": result.data, "count": len(result.data)}
+        cache_set(("/batch/pending",), response)
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/batch/all")
-async def get_all_batch_records():
+def get_all_batch_records():
     try:
-        supabase = get_supabase_client()
+        cached = cache_get(("/batch/all",))
+        if cached is not None:
+            return cached
+        
         # Add limit to prevent timeout on large datasets
         result = supabase.table("batches").select("*").order("created_at", desc=True).limit(100).execute()
-        return {"status": "success", "batches": result.data if result.data else [], "count": len(result.data) if result.data else 0}
+        response = {"status": "success", "batches": result.data if result.data else [], "count": len(result.data) if result.data else 0}
+        cache_set(("/batch/all",), response)
+        return response
     except Exception as e:
         print(f"Error in get_all_batch_records: {str(e)}")
         # Return empty result instead of error to prevent dashboard crashes
         return {"status": "error", "batches": [], "count": 0, "error": str(e)}
 
+def process_batch_approval(approval: BatchApproval, background_tasks: BackgroundTasks):
+    """Apply an FDA decision to a batch, returning the updated row or None if not found"""
+    update_data = {
+        "status": "approved" if approval.approved else "rejected",
+        "fda_approved_by": approval.fda_email,
+        "fda_approval_date": now_iso(),
+        "fda_remarks": approval.remarks
+    }
+    
+    result = supabase.table("batches").update(update_data).eq("batch_id", approval.batch_id).execute()
+    
+    if not result.data:
+        return None
+    
+    action = "Approved Batch" if approval.approved else "Rejected Batch"
+    
+    # Log to audit trail after responding
+    background_tasks.add_task(
+        log_audit,
+        user_email=approval.fda_email,
+        role="FDA",
+        action=action,
+        batch_id=approval.batch_id,
+        details={
+            "remarks": approval.remarks,
+            "decision": "approved" if approval.approved else "rejected"
+        }
+    )
+    
+    # Add to blockchain ledger
+    add_to_ledger(
+        batch_id=approval.batch_id,
+        event=f"FDA {action}",
+        actor_role="FDA",
+        actor_email=approval.fda_email,
+        data={
+            "approved": approval.approved,
+            "remarks": approval.remarks
+        }
+    )
+    
+    cache_invalidate("/batch/pending", "/batch/all", "/batch/details")
+    publish_update("batch", approval.batch_id)
+    
+    return result.data[0]
+
 @app.post("/batch/approve")
-async def approve_or_reject_batch(approval: BatchApproval):
+def approve_or_reject_batch(approval: BatchApproval, background_tasks: BackgroundTasks):
     try:
-        supabase = get_supabase_client()
-        
-        update_data = {
-            "status": "approved" if approval.approved else "rejected",
-            "fda_approved_by": approval.fda_email,
-            "fda_approval_date": datetime.utcnow().isoformat(),
-            "fda_remarks": approval.remarks
-        }
-        
-        result = supabase.table("batches").update(update_data).eq("batch_id", approval.batch_id).execute()
+        updated = process_batch_approval(approval, background_tasks)
         
-        if not result.data:
+        if not updated:
             raise HTTPException(status_code=404, detail="Batch not found")
         
-        action = "Approved Batch" if approval.approved else "Rejected Batch"
-        
-        # Log to audit trail
-        log_audit(
-            user_email=approval.fda_email,
-            role="FDA",
-            action=action,
-            batch_id=approval.batch_id,
-            details={
-                "remarks": approval.remarks,
-                "decision": "approved" if approval.approved else "rejected"
-            }
-        )
-        
-        # Add to blockchain ledger
-        add_to_ledger(
-            batch_id=approval.batch_id,
-            event=f"FDA {action}",
-            actor_role="FDA",
-            actor_email=approval.fda_email,
-            data={
-                "approved": approval.approved,
-                "remarks": approval.remarks
-            }
-        )
-        
         action_text = "approved" if approval.approved else "rejected"
         return {
             "status": "success",
             "message": f"Batch {approval.batch_id} has been {action_text} by FDA",
-            "data": result.data[0]
+            "data": updated
         }
     
     except HTTPException:
@@ -558,75 +958,164 @@ async def approve_or_reject_batch(approval: BatchApproval):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/batch/approve_bulk")
+def approve_or_reject_batches(bulk: BatchApprovalBulk, background_tasks: BackgroundTasks):
+    """Apply several FDA decisions in one request"""
+    try:
+        results = []
+        for approval in bulk.approvals:
+            updated = process_batch_approval(approval, background_tasks)
+            results.append({
+                "batch_id": approval.batch_id,
+                "status": ("approved" if approval.approved else "rejected") if updated else "not_found"
+            })
+        
+        processed = len([r for r in results if r["status"] != "not_found"])
+        return {
+            "status": "success",
+            "message": f"{processed} of {len(results)} batch decision(s) applied",
+            "results": results,
+            "count": processed
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/batch/details/{batch_id}")
-async def get_batch_details(batch_id: str):
+def get_batch_details(batch_id: str):
     try:
-        supabase = get_supabase_client()
+        cached = cache_get(("/batch/details", batch_id))
+        if cached is not None:
+            return cached
+        
         result = supabase.table("batches").select("*").eq("batch_id", batch_id).execute()
         
         if not result.data:
             raise HTTPException(status_code=404, detail="Batch not found")
         
-        return {"status": "success", "batch": result.data[0]}
+        response = {"status": "success", "batch": result.data[0]}
+        cache_set(("/batch/details", batch_id), response)
+        return response
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def find_chain_breaks(blocks: list) -> list:
+    """Indexes of ledger blocks whose prev_hash does not match the previous block's curr_hash"""
+    if len(blocks) < 2:
+        return []
+    # Object arrays keep None hashes as None, matching the != of the original per-block loop
+    prev = np.array([b["prev_hash"] for b in blocks], dtype=object)
+    curr = np.array([b["curr_hash"] for b in blocks], dtype=object)
+    return (np.flatnonzero(prev[1:] != curr[:-1]) + 1).tolist()
+
+# Latest curr_hash per batch written by this process; only a guess for append_ledger(),
+# which rejects it if another writer (worker or process) got there first. The fallback
+# path re-reads the head from the ledger on every append instead. Appends to one batch
+# are serialized within this process so concurrent requests cannot reorder links
+ledger_heads = {}
+ledger_locks = {}
+ledger_locks_guard = threading.Lock()
+
+def ledger_lock(batch_id: str) -> threading.Lock:
+    with ledger_locks_guard:
+        lock = ledger_locks.get(batch_id)
+        if lock is None:
+            lock = ledger_locks[batch_id] = threading.Lock()
+        return lock
+
 def add_to_ledger(batch_id: str, event: str, actor_role: str, actor_email: str, data: dict = None):
     """Add an entry to the blockchain ledger"""
     try:
-        supabase = get_supabase_client()
-        
-        # Get the previous hash
-        try:
-            prev_result = supabase.table("ledger").select("curr_hash").eq("batch_id", batch_id).order("timestamp", desc=True).limit(1).execute()
-            prev_hash = prev_result.data[0]["curr_hash"] if prev_result.data else "0" * 64
-        except:
-            prev_hash = "0" * 64
-        
-        # Create current hash
-        ledger_data = {
-            "batch_id": batch_id,
-            "event": event,
-            "actor_role": actor_role,
-            "actor_email": actor_email,
-            "timestamp": datetime.utcnow().isoformat(),
-            "prev_hash": prev_hash,
-            "data": data or {}
-        }
-        
-        data_string = json.dumps(ledger_data, sort_keys=True)
-        curr_hash = hashlib.sha256(data_string.encode()).hexdigest()
-        ledger_data["curr_hash"] = curr_hash
-        
-        # Insert into ledger
-        result = supabase.table("ledger").insert(ledger_data).execute()
-        return result.data[0] if result.data else None
+        with ledger_lock(batch_id):
+            return append_ledger_entry(batch_id, event, actor_role, actor_email, data)
     except Exception as e:
         print(f"Ledger error: {str(e)}")
         return None
 
+def append_ledger_entry(batch_id: str, event: str, actor_role: str, actor_email: str, data: dict = None):
+    ledger_data = {
+        "batch_id": batch_id,
+        "event": event,
+        "actor_role": actor_role,
+        "actor_email": actor_email,
+        "timestamp": now_iso(),
+        "prev_hash": ledger_heads.get(batch_id, "0" * 64),
+        "data": data or {}
+    }
+    
+    # Single round-trip append when append_ledger() exists (create_append_ledger_function.sql)
+    try:
+        for _ in range(3):
+            entry = dict(ledger_data, curr_hash=compute_hash(ledger_data))
+            result = supabase.rpc("append_ledger", {"p_entry": entry}).execute().data
+            if not result.get("conflict"):
+                ledger_heads[batch_id] = result["curr_hash"]
+                return result
+            ledger_data["prev_hash"] = result["head"]
+        print(f"Ledger error: could not append to {batch_id} after 3 attempts")
+        return None
+    except APIError as e:
+        # Only fall back when the function is not installed; any other error may have
+        # happened after the append committed
+        if not is_missing_function(e):
+            raise
+    
+    # Read the current head every time: another worker or process may have appended
+    # since this one last did, and a stale head would break the chain
+    prev_result = supabase.table("ledger").select("curr_hash").eq("batch_id", batch_id).order("timestamp", desc=True).limit(1).execute()
+    prev_hash = prev_result.data[0]["curr_hash"] if prev_result.data else "0" * 64
+    
+    # Create current hash
+    ledger_data["prev_hash"] = prev_hash
+    curr_hash = compute_hash(ledger_data)
+    ledger_data["curr_hash"] = curr_hash
+    
+    # Insert into ledger
+    result = supabase.table("ledger").insert(ledger_data).execute()
+    if result.data:
+        ledger_heads[batch_id] = curr_hash
+    return result.data[0] if result.data else None
+
+# With AUDIT_WRITE_BATCHING=on, audit entries are queued and written in bulk inserts of
+# up to 100 rows / 500 ms; by default each one is written immediately. Each entry carries
+# its own timestamp, so rows written together keep the time the action happened
+AUDIT_WRITE_BATCHING = os.getenv("AUDIT_WRITE_BATCHING", "off").lower() in ("on", "1", "true")
+audit_batcher = WriteBatcher(
+    lambda rows: supabase.table("audit_logs").insert(rows).execute(),
+    max_rows=100,
+    max_wait=0.5,
+    name="audit-write-batcher"
+)
+
+@app.on_event("shutdown")
+def flush_audit_batcher():
+    audit_batcher.flush()
+
 def log_audit(user_email: str, role: str, action: str, batch_id: str = None, details: dict = None):
     """Log user action to audit trail"""
     try:
-        supabase = get_supabase_client()
-        
+        timestamp = now_iso()
         audit_data = {
             "user_email": user_email,
             "role": role,
             "action": action,
             "batch_id": batch_id,
             "details": details or {},
-            "hash_ref": hashlib.sha256(f"{user_email}{action}{datetime.utcnow().isoformat()}".encode()).hexdigest()
+            "timestamp": timestamp,
+            "hash_ref": reference_hex(f"{user_email}{action}{timestamp}")
         }
         
-        supabase.table("audit_logs").insert(audit_data).execute()
+        if AUDIT_WRITE_BATCHING:
+            audit_batcher.put(audit_data)
+        else:
+            supabase.table("audit_logs").insert(audit_data).execute()
     except Exception as e:
         print(f"Audit log error: {str(e)}")
 
 @app.post("/ledger/add")
-async def add_ledger_entry(entry: LedgerEntry):
+def add_ledger_entry(entry: LedgerEntry):
     try:
         result = add_to_ledger(
             batch_id=entry.batch_id,
@@ -644,17 +1133,26 @@ async def add_ledger_entry(entry: LedgerEntry):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/ledger/{batch_id}")
-async def get_batch_ledger(batch_id: str):
+def get_batch_ledger(batch_id: str, request: Request):
     try:
-        supabase = get_supabase_client()
+        if wants_ndjson(request):
+            # Page through the chain and flag breaks on the fly, holding one block at a time
+            def blocks():
+                prev_curr_hash = None
+                for i, block in enumerate(iter_pages(supabase.table("ledger").select("*").eq("batch_id", batch_id).order("timestamp", desc=False))):
+                    if i > 0 and block["prev_hash"] != prev_curr_hash:
+                        block["tampered"] = True
+                    prev_curr_hash = block["curr_hash"]
+                    yield block
+            return ndjson_response(blocks())
+        
         result = supabase.table("ledger").select("*").eq("batch_id", batch_id).order("timestamp", desc=False).execute()
         
         # Verify blockchain integrity
-        is_valid = True
-        for i in range(1, len(result.data)):
-            if result.data[i]["prev_hash"] != result.data[i-1]["curr_hash"]:
-                is_valid = False
-                result.data[i]["tampered"] = True
+        tampered_blocks = find_chain_breaks(result.data)
+        for i in tampered_blocks:
+            result.data[i]["tampered"] = True
+        is_valid = not tampered_blocks
         
         return {
             "status": "success",
@@ -666,46 +1164,77 @@ async def get_batch_ledger(batch_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/ledger/{batch_id}/verify")
+def verify_batch_ledger(batch_id: str):
+    """Check one batch's hash chain without downloading its blocks"""
+    try:
+        # Only mismatches come back when ledger_tampered() exists (create_ledger_tampered_function.sql)
+        try:
+            tampered_blocks = [row["idx"] for row in supabase.rpc("ledger_tampered", {"bid": batch_id}).execute().data]
+        except Exception:
+            blocks = list(iter_pages(supabase.table("ledger").select("prev_hash,curr_hash").eq("batch_id", batch_id).order("timestamp", desc=False)))
+            tampered_blocks = find_chain_breaks(blocks)
+        
+        return {
+            "status": "success",
+            "batch_id": batch_id,
+            "blockchain_valid": not tampered_blocks,
+            "tampered_blocks": tampered_blocks
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/ledger/verify/all")
-async def verify_all_ledgers():
+def verify_all_ledgers():
     """Public blockchain explorer - verify all batches"""
     try:
-        supabase = get_supabase_client()
+        # Single query when verify_ledger_chains() exists (create_verify_ledger_chains_function.sql)
+        try:
+            chains = supabase.rpc("verify_ledger_chains").execute().data
+            verification_results = [
+                {
+                    "batch_id": c["batch_id"],
+                    "total_blocks": c["total_blocks"],
+                    "is_valid": not c["tampered_blocks"],
+                    "tampered_blocks": c["tampered_blocks"]
+                }
+                for c in chains
+            ]
+            return {
+                "status": "success",
+                "total_batches": len(verification_results),
+                "verifications": verification_results
+            }
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
         
-        # Get all unique batch IDs
-        batches_result = supabase.table("ledger").select("batch_id").execute()
-        unique_batches = list(set([b["batch_id"] for b in batches_result.data]))
+        # Fallback: read the whole ledger in one ordered scan and split it per batch
+        rows = iter_pages(supabase.table("ledger").select("batch_id, prev_hash, curr_hash").order("batch_id").order("timestamp"))
         
         verification_results = []
         
-        for batch_id in unique_batches:
-            ledger_result = supabase.table("ledger").select("*").eq("batch_id", batch_id).order("timestamp", desc=False).execute()
-            
-            is_valid = True
-            tampered_blocks = []
-            
-            for i in range(1, len(ledger_result.data)):
-                if ledger_result.data[i]["prev_hash"] != ledger_result.data[i-1]["curr_hash"]:
-                    is_valid = False
-                    tampered_blocks.append(i)
+        for batch_id, group in groupby(rows, key=itemgetter("batch_id")):
+            blocks = list(group)
+            tampered_blocks = find_chain_breaks(blocks)
             
             verification_results.append({
                 "batch_id": batch_id,
-                "total_blocks": len(ledger_result.data),
-                "is_valid": is_valid,
+                "total_blocks": len(blocks),
+                "is_valid": not tampered_blocks,
                 "tampered_blocks": tampered_blocks
             })
         
         return {
             "status": "success",
-            "total_batches": len(unique_batches),
+            "total_batches": len(verification_results),
             "verifications": verification_results
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/audit/log")
-async def create_audit_log(log: AuditLog):
+def create_audit_log(log: AuditLog):
     try:
         log_audit(
             user_email=log.user_email,
@@ -719,10 +1248,8 @@ async def create_audit_log(log: AuditLog):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/audit/logs")
-async def get_audit_logs(limit: int = 100, batch_id: Optional[str] = None):
+def get_audit_logs(request: Request, limit: int = 100, batch_id: Optional[str] = None):
     try:
-        supabase = get_supabase_client()
-        
         query = supabase.table("audit_logs").select("*")
         
         if batch_id:
@@ -730,41 +1257,61 @@ async def get_audit_logs(limit: int = 100, batch_id: Optional[str] = None):
         
         result = query.order("timestamp", desc=True).limit(limit).execute()
         
+        if wants_ndjson(request):
+            return ndjson_response(result.data)
         return {"status": "success", "logs": result.data, "count": len(result.data)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/alerts/realtime")
-async def get_realtime_alerts(limit: int = 50):
+def get_realtime_alerts(limit: int = 50):
     try:
-        supabase = get_supabase_client()
         result = supabase.table("alerts_log").select("*").eq("acknowledged", False).order("timestamp", desc=True).limit(limit).execute()
         return {"status": "success", "alerts": result.data, "count": len(result.data)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/alerts/acknowledge/{alert_id}")
-async def acknowledge_alert(alert_id: int, user_email: str):
+def acknowledge_alert(alert_id: int, user_email: str, background_tasks: BackgroundTasks):
     try:
-        supabase = get_supabase_client()
-        
         update_data = {
             "acknowledged": True,
             "acknowledged_by": user_email,
-            "acknowledged_at": datetime.utcnow().isoformat()
+            "acknowledged_at": now_iso()
         }
         
         result = supabase.table("alerts_log").update(update_data).eq("id", alert_id).execute()
         
         if result.data:
-            log_audit(user_email, "Unknown", f"Acknowledged alert {alert_id}", details={"alert_id": alert_id})
+            background_tasks.add_task(log_audit, user_email, "Unknown", f"Acknowledged alert {alert_id}", details={"alert_id": alert_id})
+            publish_update("alert")
         
         return {"status": "success", "message": "Alert acknowledged"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/updates/latest")
+async def get_latest_update():
+    """Sequence number of the last data change, for clients that poll instead of subscribing"""
+    return latest_update()
+
+@app.websocket("/ws/updates")
+async def updates_socket(websocket: WebSocket):
+    """Push a small {seq, kind, batch_id, ts} event whenever data changes"""
+    await websocket.accept()
+    subscribe(websocket)
+    try:
+        await websocket.send_json(latest_update())
+        while True:
+            # Clients do not send anything; this just waits for the disconnect
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        unsubscribe(websocket)
+
 @app.get("/route")
-async def get_shipment_route(origin: str = "Chennai, Tamil Nadu", destination: str = "Bengaluru, Karnataka"):
+def get_shipment_route(origin: str = "Chennai, Tamil Nadu", destination: str = "Bengaluru, Karnataka"):
     """Get live route between origin and destination using Google Directions API"""
     try:
         route_data = get_route_directions(origin, destination)
@@ -778,15 +1325,12 @@ async def get_shipment_route(origin: str = "Chennai, Tamil Nadu", destination: s
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/geocode")
-async def geocode_location(address: str):
+def geocode_location(address: str):
     """Convert address to coordinates"""
     if not GOOGLE_API_KEY:
         raise HTTPException(status_code=500, detail="Google API key not configured")
     try:
-        res = requests.get(
-            f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={GOOGLE_API_KEY}",
-            timeout=5
-        )
+        res = google_session.get(GEOCODE_URL, params={"address": address, "key": GOOGLE_API_KEY}, timeout=5)
         data = res.json()
         if data.get("results"):
             location = data["results"][0]["geometry"]["location"]
@@ -803,9 +1347,14 @@ async def geocode_location(address: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "PharmaChain Backend", "google_maps": "enabled" if GOOGLE_API_KEY else "disabled"}
+# /health is polled on every dashboard render; its body never changes, so serialize it
+# once and serve it from a bare Starlette route without FastAPI's request/response handling
+HEALTH_BODY = json.dumps({"status": "healthy", "service": "PharmaChain Backend", "google_maps": "enabled" if GOOGLE_API_KEY else "disabled", "hash_algo": IOT_HASH_ALGORITHM}).encode()
+
+async def health_check(request):
+    return Response(HEALTH_BODY, media_type="application/json")
+
+app.add_route("/health", health_check, methods=["GET"])
 
 
 # ============================================================================
@@ -823,50 +1372,68 @@ class RouteUpdate(BaseModel):
     status: str  # "in_transit", "delivered", "cancelled"
     updated_by: str
 
+# Warehouse and pharmacy addresses repeat across batches; keep their coordinates and the
+# routes between them for two days. Only successful lookups are cached
+ROUTE_LOOKUP_TTL_SECONDS = 48 * 3600
+geocoded_addresses = TTLCache(max_entries=4096, ttl=ROUTE_LOOKUP_TTL_SECONDS)
+route_directions = TTLCache(max_entries=4096, ttl=ROUTE_LOOKUP_TTL_SECONDS)
+
 def geocode_address(address: str):
     """Convert address to coordinates using Google Geocoding API"""
     if not GOOGLE_API_KEY:
         return None, None
+    key = " ".join(address.lower().split())
+    cached = geocoded_addresses.get(key)
+    if cached is not None:
+        return cached
     try:
-        res = requests.get(
-            f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={GOOGLE_API_KEY}",
-            timeout=5
-        )
+        res = google_session.get(GEOCODE_URL, params={"address": address, "key": GOOGLE_API_KEY}, timeout=5)
         data = res.json()
         if data.get("results"):
             location = data["results"][0]["geometry"]["location"]
-            return location["lat"], location["lng"]
+            coordinates = location["lat"], location["lng"]
+            geocoded_addresses.set(key, coordinates)
+            return coordinates
         return None, None
-    except:
+    except (requests.RequestException, ValueError, KeyError) as e:
+        # Network failures (after the session's retries), non-JSON bodies and unexpected
+        # result shapes; anything else is a bug and propagates
+        print(f"Geocoding error for '{address}': {str(e)}")
         return None, None
 
 def get_route_directions(origin_lat, origin_lng, dest_lat, dest_lng):
     """Get route details using Google Directions API"""
     if not GOOGLE_API_KEY:
         return None
+    # Rounded to 4 decimals (~11 m), like the reverse-geocoding cache
+    key = (round(origin_lat, 4), round(origin_lng, 4), round(dest_lat, 4), round(dest_lng, 4))
+    cached = route_directions.get(key)
+    if cached is not None:
+        return cached
     try:
-        url = f"https://maps.googleapis.com/maps/api/directions/json?origin={origin_lat},{origin_lng}&destination={dest_lat},{dest_lng}&key={GOOGLE_API_KEY}"
-        res = requests.get(url, timeout=10)
+        res = google_session.get(DIRECTIONS_URL, params={"origin": f"{origin_lat},{origin_lng}", "destination": f"{dest_lat},{dest_lng}", "key": GOOGLE_API_KEY}, timeout=10)
         data = res.json()
         
         if data.get("status") == "OK" and data.get("routes"):
             route = data["routes"][0]
             leg = route["legs"][0]
             
-            return {
+            directions = {
                 "distance": leg["distance"]["text"],
                 "duration": leg["duration"]["text"],
                 "polyline": route["overview_polyline"]["points"],
                 "start_address": leg["start_address"],
                 "end_address": leg["end_address"]
             }
+            route_directions.set(key, directions)
+            return directions
         return None
     except Exception as e:
         print(f"Directions API error: {str(e)}")
         return None
 
 @app.post("/shipment/route")
-async def create_or_update_shipment_route(route: ShipmentRoute):
+def create_or_update_shipment_route(route: ShipmentRoute, background_tasks: BackgroundTasks):
     """
     Create or update a shipment route for a batch
     - Geocodes addresses to coordinates
@@ -874,15 +1441,13 @@ async def create_or_update_shipment_route(route: ShipmentRoute):
     - Stores in Supabase shipment_routes table
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Geocode from address
+        # Geocode both addresses concurrently: 'to' on the Google pool while this thread does 'from'
+        to_lookup = google_executor.submit(geocode_address, route.to_address)
         from_lat, from_lng = geocode_address(route.from_address)
+        to_lat, to_lng = to_lookup.result()
         if not from_lat or not from_lng:
             raise HTTPException(status_code=400, detail="Could not geocode 'from' address")
         
-        # Geocode to address
-        to_lat, to_lng = geocode_address(route.to_address)
         if not to_lat or not to_lng:
             raise HTTPException(status_code=400, detail="Could not geocode 'to' address")
         
@@ -905,14 +1470,15 @@ async def create_or_update_shipment_route(route: ShipmentRoute):
             "polyline": directions["polyline"],
             "status": "in_transit",
             "updated_by": route.updated_by,
-            "last_updated": datetime.utcnow().isoformat()
+            "last_updated": now_iso()
         }
         
         # Insert into Supabase
         result = supabase.table("shipment_routes").insert(route_data).execute()
         
-        # Log to audit trail
-        log_audit(
+        # Log to audit trail after responding
+        background_tasks.add_task(
+            log_audit,
             user_email=route.updated_by,
             role="System",
             action="Created Shipment Route",
@@ -942,15 +1508,18 @@ async def create_or_update_shipment_route(route: ShipmentRoute):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Every shipment_routes column except the encoded polyline, which is only needed to draw maps
+ROUTE_SUMMARY_COLUMNS = "id,batch_id,from_address,to_address,from_lat,from_lng,to_lat,to_lng,distance,duration,status,updated_by,last_updated,created_at"
+
 @app.get("/shipment/routes/{batch_id}")
-async def get_shipment_routes(batch_id: str):
+def get_shipment_routes(batch_id: str, fields: str = Query("full", pattern="^(full|summary)$")):
     """
     Get all route entries for a specific batch
-    Returns the complete journey timeline
+    Returns the complete journey timeline (?fields=summary leaves out the polylines)
     """
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("shipment_routes").select("*").eq("batch_id", batch_id).order("created_at", desc=False).execute()
+        columns = ROUTE_SUMMARY_COLUMNS if fields == "summary" else "*"
+        result = supabase.table("shipment_routes").select(columns).eq("batch_id", batch_id).order("created_at", desc=False).execute()
         
         return {
             "status": "success",
@@ -962,12 +1531,11 @@ async def get_shipment_routes(batch_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/shipment/route/latest/{batch_id}")
-async def get_latest_shipment_route(batch_id: str):
+def get_latest_shipment_route(batch_id: str):
     """
     Get the most recent route entry for a batch
     """
     try:
-        supabase = get_supabase_client()
         result = supabase.table("shipment_routes").select("*").eq("batch_id", batch_id).order("created_at", desc=True).limit(1).execute()
         
         if not result.data:
@@ -986,32 +1554,41 @@ async def get_latest_shipment_route(batch_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def update_latest_route(update: RouteUpdate) -> list:
+    """Look up the batch's latest route, then update it (before update_latest_route_status() existed)"""
+    # Get the latest route (only its id is needed for the update)
+    result = supabase.table("shipment_routes").select("id").eq("batch_id", update.batch_id).order("created_at", desc=True).limit(1).execute()
+    
+    if not result.data:
+        return []
+    
+    update_data = {
+        "status": update.status,
+        "last_updated": now_iso()
+    }
+    
+    return supabase.table("shipment_routes").update(update_data).eq("id", result.data[0]["id"]).execute().data
+
 @app.post("/shipment/route/status")
-async def update_route_status(update: RouteUpdate):
+def update_route_status(update: RouteUpdate, background_tasks: BackgroundTasks):
     """
     Update the status of the latest route for a batch
     """
     try:
-        supabase = get_supabase_client()
-        
-        # Get the latest route
-        result = supabase.table("shipment_routes").select("*").eq("batch_id", update.batch_id).order("created_at", desc=True).limit(1).execute()
+        # One round trip when update_latest_route_status() exists (create_update_latest_route_status_function.sql)
+        try:
+            updated_rows = supabase.rpc("update_latest_route_status", {"p_batch_id": update.batch_id, "p_status": update.status}).execute().data
+        except APIError as e:
+            if not is_missing_function(e):
+                raise
+            updated_rows = update_latest_route(update)
         
-        if not result.data:
+        if not updated_rows:
             raise HTTPException(status_code=404, detail="No route found for this batch")
         
-        route_id = result.data[0]["id"]
-        
-        # Update status
-        update_data = {
-            "status": update.status,
-            "last_updated": datetime.utcnow().isoformat()
-        }
-        
-        updated = supabase.table("shipment_routes").update(update_data).eq("id", route_id).execute()
-        
-        # Log to audit trail
-        log_audit(
+        # Log to audit trail after responding
+        background_tasks.add_task(
+            log_audit,
             user_email=update.updated_by,
             role="System",
             action="Updated Route Status",
@@ -1022,7 +1599,7 @@ async def update_route_status(update: RouteUpdate):
         return {
             "status": "success",
             "message": f"Route status updated to {update.status}",
-            "data": updated.data[0] if updated.data else None
+            "data": updated_rows[0]
         }
     
     except HTTPException:
@@ -1030,17 +1607,48 @@ async def update_route_status(update: RouteUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def route_integrity_flags(routes: list) -> list:
+    """Python equivalent of route_integrity(): the summary columns plus per-hop issue flags"""
+    # Continuity is a soft check - addresses might be slightly different but coordinates
+    # should be close (~11km). Missing or zero coordinates become NaN, which never compares
+    # as a jump, so those hops are skipped like before
+    def coords(field):
+        return np.fromiter((r.get(field) or np.nan for r in routes), dtype=np.float64, count=len(routes))
+    from_lat, from_lng, to_lat, to_lng = coords("from_lat"), coords("from_lng"), coords("to_lat"), coords("to_lng")
+    lat_diff = np.abs(from_lat[1:] - to_lat[:-1])
+    lng_diff = np.abs(from_lng[1:] - to_lng[:-1])
+    discontinuous = np.zeros(len(routes), dtype=bool)
+    discontinuous[1:] = ~np.isnan(lat_diff) & ((lat_diff > 0.1) | (lng_diff > 0.1))
+    
+    return [
+        {
+            "from_address": route.get("from_address"),
+            "to_address": route.get("to_address"),
+            "distance": route.get("distance"),
+            "duration": route.get("duration"),
+            "created_at": route.get("created_at"),
+            "missing_address": not route.get("from_address") or not route.get("to_address"),
+            "missing_metrics": not route.get("distance") or not route.get("duration"),
+            "discontinuous": bool(jump)
+        }
+        for route, jump in zip(routes, discontinuous)
+    ]
+
 @app.get("/shipment/route/verify/{batch_id}")
-async def verify_route_integrity(batch_id: str):
+def verify_route_integrity(batch_id: str):
     """
     Verify route data integrity for FDA dashboard
     Checks if route data is consistent and valid
     """
     try:
-        supabase = get_supabase_client()
-        result = supabase.table("shipment_routes").select("*").eq("batch_id", batch_id).order("created_at", desc=False).execute()
+        # Checks run in Postgres when route_integrity() exists (create_route_integrity_function.sql)
+        try:
+            routes = supabase.rpc("route_integrity", {"bid": batch_id}).execute().data
+        except Exception:
+            result = supabase.table("shipment_routes").select("from_address,to_address,from_lat,from_lng,to_lat,to_lng,distance,duration,created_at").eq("batch_id", batch_id).order("created_at", desc=False).execute()
+            routes = route_integrity_flags(result.data)
         
-        if not result.data:
+        if not routes:
             return {
                 "status": "success",
                 "batch_id": batch_id,
@@ -1049,31 +1657,22 @@ async def verify_route_integrity(batch_id: str):
                 "total_routes": 0
             }
         
-        routes = result.data
         is_valid = True
         issues = []
         
         # Check for data consistency
         for i, route in enumerate(routes):
-            # Check if required fields are present
-            if not route.get("from_address") or not route.get("to_address"):
+            if route["missing_address"]:
                 is_valid = False
                 issues.append(f"Route {i+1}: Missing address data")
             
-            if not route.get("distance") or not route.get("duration"):
+            if route["missing_metrics"]:
                 is_valid = False
                 issues.append(f"Route {i+1}: Missing distance/duration data")
             
             # Check if next route starts where previous ended
-            if i > 0:
-                prev_route = routes[i-1]
-                # This is a soft check - addresses might be slightly different
-                # but coordinates should be close
-                if route.get("from_lat") and prev_route.get("to_lat"):
-                    lat_diff = abs(route["from_lat"] - prev_route["to_lat"])
-                    lng_diff = abs(route["from_lng"] - prev_route["to_lng"])
-                    if lat_diff > 0.1 or lng_diff > 0.1:  # ~11km tolerance
-                        issues.append(f"Route {i+1}: Discontinuous journey detected")
+            if route["discontinuous"]:
+                issues.append(f"Route {i+1}: Discontinuous journey detected")
         
         return {
             "status": "success",
@@ -10,6 +10,7 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
 
+# Created once at import and shared by every request so connections are reused
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 def get_supabase_client() -> Client:
@@ -0,0 +1,53 @@
+"""
+Push notifications for data changes
+Write handlers publish a small event that is sent to every /ws/updates subscriber,
+and the latest event is kept so polling clients can cheaply check for changes
+"""
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+_subscribers = set()
+_loop = None
+_latest = {"seq": 0, "kind": None, "batch_id": None, "ts": None}
+
+def latest_update() -> dict:
+    """Return the most recent update event (seq 0 means nothing has changed since startup)"""
+    with _lock:
+        return dict(_latest)
+
+def publish_update(kind: str, batch_id: str = None):
+    """Record a change and push it to websocket subscribers
+
+    Safe to call from the threadpool that runs the sync route handlers.
+    """
+    with _lock:
+        _latest["seq"] += 1
+        _latest["kind"] = kind
+        _latest["batch_id"] = batch_id
+        _latest["ts"] = datetime.now(timezone.utc).isoformat()
+        event = dict(_latest)
+        loop = _loop
+        targets = list(_subscribers)
+    if loop is None or not targets:
+        return
+    for websocket in targets:
+        asyncio.run_coroutine_threadsafe(_send(websocket, event), loop)
+
+async def _send(websocket, event: dict):
+    try:
+        await websocket.send_json(event)
+    except Exception:
+        unsubscribe(websocket)
+
+def subscribe(websocket):
+    """Register an accepted websocket; must be called from the event loop"""
+    global _loop
+    with _lock:
+        _loop = asyncio.get_running_loop()
+        _subscribers.add(websocket)
+
+def unsubscribe(websocket):
+    with _lock:
+        _subscribers.discard(websocket)
@@ -0,0 +1,95 @@
+"""
+Coalesced inserts for high-rate writes (IoT readings, audit entries)
+Rows are queued by the request handlers and written by one background thread as a
+single bulk insert per batch (up to max_rows rows, or whatever arrived within max_wait).
+If a bulk insert fails the rows are retried one at a time, so one bad row does not
+take the rest of its batch with it
+"""
+import queue
+import threading
+import time
+
+class WriteBatcher:
+    def __init__(self, insert, on_flush=None, max_rows=256, max_wait=0.2, max_queued=10000, name="write-batcher"):
+        self.insert = insert
+        self.on_flush = on_flush
+        self.max_rows = max_rows
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def put(self, row: dict):
+        """Queue a row for the next flush, blocking if the queue is full"""
+        if self._stopped.is_set():
+            # Shutting down: nothing will drain the queue any more, so write it now
+            self._write([row])
+            return
+        self._ensure_started()
+        self._queue.put(row)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: dict) -> list:
+        rows = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(rows) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return rows
+
+    def _write(self, rows: list):
+        try:
+            self.insert(rows)
+            written = rows
+        except Exception as e:
+            print(f"Batched insert error ({len(rows)} rows), retrying one at a time: {str(e)}")
+            written = []
+            for row in rows:
+                try:
+                    self.insert([row])
+                    written.append(row)
+                except Exception as row_error:
+                    print(f"Dropped row after insert error: {str(row_error)}")
+        if written and self.on_flush:
+            try:
+                self.on_flush(written)
+            except Exception as e:
+                print(f"Flush callback error: {str(e)}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            self._write(self._collect(first))
+
+    def flush(self):
+        """Stop the worker (letting it finish the batch it holds) and write everything still queued; called on shutdown"""
+        self._stopped.set()
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(rows), self.max_rows):
+            self._write(rows[start:start + self.max_rows])
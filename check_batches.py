@@ -1,6 +1,7 @@
 """Check recent batches in database"""
 from supabase import create_client
 import os
+import pandas as pd
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,12 +15,12 @@ result = supabase.table('batches').select('*').order('created_at', desc=True).li
 
 print(f"\nTotal batches: {len(result.data)}\n")
 
-for batch in result.data:
-    print(f"Batch ID: {batch['batch_id']}")
-    print(f"  Status: {batch['status']}")
-    print(f"  Product: {batch.get('product_name', 'N/A')}")
-    print(f"  Created: {batch.get('created_at', 'N/A')[:19]}")
-    print(f"  FDA Approved: {batch.get('fda_approved_by', 'Not yet')}")
+df = pd.DataFrame(result.data).reindex(columns=["batch_id", "status", "product_name", "created_at", "fda_approved_by"])
+if not df.empty:
+    df["product_name"] = df["product_name"].fillna("N/A")
+    df["created_at"] = df["created_at"].fillna("N/A").astype(str).str[:19]
+    df["fda_approved_by"] = df["fda_approved_by"].fillna("Not yet")
+    print(df.to_string(index=False))
     print()
 
 print("=" * 70)
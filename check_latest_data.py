@@ -4,6 +4,7 @@ Check the latest data in Supabase to see ESP32 readings
 from supabase import create_client
 from dotenv import load_dotenv
 import os
+import pandas as pd
 
 load_dotenv()
 
@@ -12,25 +13,21 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+RECORD_COLUMNS = ["id", "batch_id", "sensor_id", "temperature", "humidity", "location", "timestamp", "is_alert"]
+
 print("=" * 70)
 print("Latest 10 IoT Data Records from Supabase")
 print("=" * 70)
 
 try:
-    result = supabase.table("iot_data").select("*").order("timestamp", desc=True).limit(10).execute()
+    result = supabase.table("iot_data").select(",".join(RECORD_COLUMNS)).order("timestamp", desc=True).limit(10).execute()
     
     if result.data:
         print(f"\nFound {len(result.data)} records\n")
-        for idx, record in enumerate(result.data, 1):
-            print(f"{idx}. ID: {record['id']}")
-            print(f"   Batch: {record['batch_id']}")
-            print(f"   Sensor: {record['sensor_id']}")
-            print(f"   Temperature: {record['temperature']}°C")
-            print(f"   Humidity: {record['humidity']}%")
-            print(f"   Location: {record['location']}")
-            print(f"   Timestamp: {record['timestamp']}")
-            print(f"   Alert: {record.get('is_alert', False)}")
-            print("-" * 70)
+        df = pd.DataFrame(result.data).reindex(columns=RECORD_COLUMNS)
+        df["is_alert"] = df["is_alert"].fillna(False)
+        df.index = range(1, len(df) + 1)
+        print(df.to_string())
     else:
         print("No data found")
         
@@ -42,12 +39,13 @@ print("Looking for ESP32 data specifically...")
 print("=" * 70)
 
 try:
-    esp_result = supabase.table("iot_data").select("*").eq("sensor_id", "ESP32_SENSOR_01").order("timestamp", desc=True).limit(5).execute()
+    esp_result = supabase.table("iot_data").select("temperature,humidity,timestamp").eq("sensor_id", "ESP32_SENSOR_01").order("timestamp", desc=True).limit(5).execute()
     
     if esp_result.data:
         print(f"\nFound {len(esp_result.data)} ESP32 records\n")
-        for idx, record in enumerate(esp_result.data, 1):
-            print(f"{idx}. Temperature: {record['temperature']}°C | Humidity: {record['humidity']}% | Time: {record['timestamp']}")
+        esp_df = pd.DataFrame(esp_result.data, columns=["temperature", "humidity", "timestamp"])
+        esp_df.index = range(1, len(esp_df) + 1)
+        print(esp_df.to_string())
     else:
         print("No ESP32 data found")
         
@@ -19,9 +19,9 @@ print("=" * 70)
 
 # Find batches with old location format
 print("\n1. Finding batches with 'Enable Geocoding API' in location...")
-result = supabase.table("batches").select("*").execute()
+result = supabase.table("batches").select("batch_id,initial_location").like("initial_location", "%Enable Geocoding API%").execute()
 
-old_batches = [b for b in result.data if "Enable Geocoding API" in b.get("initial_location", "")]
+old_batches = result.data
 
 if not old_batches:
     print("✅ No old batches found! All batches have proper location format.")
@@ -31,12 +31,21 @@ else:
         print(f"  - {batch['batch_id']}: {batch['initial_location']}")
     
     print("\n2. Deleting old batches...")
-    for batch in old_batches:
-        try:
-            supabase.table("batches").delete().eq("batch_id", batch['batch_id']).execute()
-            print(f"  ✅ Deleted: {batch['batch_id']}")
-        except Exception as e:
-            print(f"  ❌ Error deleting {batch['batch_id']}: {e}")
+    batch_ids = [batch['batch_id'] for batch in old_batches]
+    try:
+        # One DELETE ... WHERE batch_id IN (...) for all of them
+        supabase.table("batches").delete().in_("batch_id", batch_ids).execute()
+        for batch_id in batch_ids:
+            print(f"  ✅ Deleted: {batch_id}")
+    except Exception as bulk_error:
+        # Retry one at a time so the failing batch can be identified
+        print(f"  ⚠️ Bulk delete failed ({bulk_error}), deleting individually...")
+        for batch_id in batch_ids:
+            try:
+                supabase.table("batches").delete().eq("batch_id", batch_id).execute()
+                print(f"  ✅ Deleted: {batch_id}")
+            except Exception as e:
+                print(f"  ❌ Error deleting {batch_id}: {e}")
     
     print(f"\n✅ Cleanup complete! Deleted {len(old_batches)} old batch(es).")
 
@@ -2,35 +2,24 @@
 Blockchain Ledger Viewer Component
 Displays chain of custody with hash verification
 """
+import hashlib
+import json
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-from datetime import datetime
 
-def display_blockchain_ledger(ledger_data, batch_id):
-    """Display blockchain ledger with visual timeline"""
-    
-    if not ledger_data or len(ledger_data) == 0:
-        st.info("No blockchain records found for this batch")
-        return
-    
-    st.subheader(f"🔗 Blockchain Ledger: {batch_id}")
-    
-    # Verify integrity
-    is_valid = True
-    for i in range(1, len(ledger_data)):
-        if ledger_data[i]["prev_hash"] != ledger_data[i-1]["curr_hash"]:
-            is_valid = False
-            break
-    
-    if is_valid:
-        st.success(f"✅ Blockchain Integrity Verified - {len(ledger_data)} blocks")
-    else:
-        st.error("⚠️ Blockchain Tampering Detected!")
-    
-    # Timeline visualization
+def chain_link_mask(ledger_data):
+    """Per-block flags: True where prev_hash matches the previous block's curr_hash (block 0 is always True)"""
+    # Object arrays keep None hashes as None, so a missing hash still compares unequal
+    prev = np.array([b["prev_hash"] for b in ledger_data[1:]], dtype=object)
+    curr = np.array([b["curr_hash"] for b in ledger_data[:-1]], dtype=object)
+    return np.concatenate([[True], prev == curr]).astype(bool)
+
+def build_timeline_figure(ledger_data):
+    """Chain of custody timeline: one marker per block, labelled with its event"""
     events = [entry["event"] for entry in ledger_data]
-    timestamps = [datetime.fromisoformat(entry["timestamp"].replace('Z', '+00:00')) for entry in ledger_data]
+    timestamps = pd.to_datetime([entry["timestamp"] for entry in ledger_data], utc=True, format="ISO8601")
     actors = [entry["actor_role"] for entry in ledger_data]
     
     fig = go.Figure()
@@ -53,8 +42,40 @@ def display_blockchain_ledger(ledger_data, batch_id):
         height=400,
         showlegend=False
     )
+    return fig
+
+def timeline_figure(ledger_data, batch_id):
+    """Timeline figure for this ledger, rebuilt only when its blocks change between reruns"""
+    # Each curr_hash covers its block's event, actor and timestamp, so the hashes identify the content
+    key = hashlib.blake2b(
+        json.dumps([batch_id] + [b["curr_hash"] for b in ledger_data], separators=(",", ":")).encode(),
+        digest_size=16
+    ).hexdigest()
+    if st.session_state.get("ledger_fig_key") != key:
+        st.session_state["ledger_fig"] = build_timeline_figure(ledger_data)
+        st.session_state["ledger_fig_key"] = key
+    return st.session_state["ledger_fig"]
+
+def display_blockchain_ledger(ledger_data, batch_id):
+    """Display blockchain ledger with visual timeline"""
+    
+    if not ledger_data or len(ledger_data) == 0:
+        st.info("No blockchain records found for this batch")
+        return
+    
+    st.subheader(f"🔗 Blockchain Ledger: {batch_id}")
+    
+    # Verify integrity once; the block expanders below reuse the same mask
+    valid_mask = chain_link_mask(ledger_data)
+    is_valid = bool(valid_mask.all())
+    
+    if is_valid:
+        st.success(f"✅ Blockchain Integrity Verified - {len(ledger_data)} blocks")
+    else:
+        st.error("⚠️ Blockchain Tampering Detected!")
     
-    st.plotly_chart(fig, use_container_width=True)
+    # Timeline visualization
+    st.plotly_chart(timeline_figure(ledger_data, batch_id), use_container_width=True)
     
     # Detailed blocks
     st.markdown("### 📦 Block Details")
@@ -80,11 +101,24 @@ def display_blockchain_ledger(ledger_data, batch_id):
             
             # Verify this block
             if idx > 0:
-                if block['prev_hash'] == ledger_data[idx-1]['curr_hash']:
+                if valid_mask[idx]:
                     st.success("✅ Hash chain valid")
                 else:
                     st.error("❌ Hash mismatch - tampering detected!")
 
+@st.cache_data(ttl=60, show_spinner=False)
+def prepare_audit_frame(audit_data):
+    """Audit table with formatted timestamps plus unique user/batch counts, cached per payload"""
+    df = pd.DataFrame(audit_data)
+    
+    # Format timestamp
+    if 'timestamp' in df.columns:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601', utc=True).dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    unique_users = df['user_email'].nunique() if 'user_email' in df.columns else 0
+    unique_batches = df['batch_id'].nunique() if 'batch_id' in df.columns else 0
+    return df, unique_users, unique_batches
+
 def display_audit_logs(audit_data):
     """Display audit trail"""
     
@@ -94,11 +128,7 @@ def display_audit_logs(audit_data):
     
     st.subheader("📋 Audit Trail")
     
-    df = pd.DataFrame(audit_data)
-    
-    # Format timestamp
-    if 'timestamp' in df.columns:
-        df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    df, unique_users, unique_batches = prepare_audit_frame(audit_data)
     
     # Display as table
     display_cols = ['timestamp', 'user_email', 'role', 'action', 'batch_id']
@@ -116,8 +146,6 @@ def display_audit_logs(audit_data):
     with col1:
         st.metric("Total Actions", len(df))
     with col2:
-        unique_users = df['user_email'].nunique() if 'user_email' in df.columns else 0
         st.metric("Unique Users", unique_users)
     with col3:
-        unique_batches = df['batch_id'].nunique() if 'batch_id' in df.columns else 0
         st.metric("Batches Affected", unique_batches)
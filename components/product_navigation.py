@@ -2,21 +2,122 @@
 Product Navigation Component
 Handles route visualization and management for pharmaceutical batches
 """
+import functools
 import streamlit as st
+import streamlit.components.v1 as components
 import requests
 import folium
-from streamlit_folium import st_folium
+from folium.plugins import FastMarkerCluster
 import polyline
+import re
+import time
+import numpy as np
+try:
+    # Rust decoder; falls back to the pure-Python polyline package when not installed
+    from pypolyline.cutil import decode_polyline as fast_decode_polyline
+except ImportError:
+    fast_decode_polyline = None
+
+# Decode backend responses with orjson when it is installed (the API already encodes with it)
+try:
+    import orjson
+
+    def decode_json(response):
+        return orjson.loads(response.content)
+except ImportError:
+    def decode_json(response):
+        return response.json()
 from datetime import datetime
 
 BACKEND_URL = "http://localhost:8000"
 
+# Directions API leg distances look like "1,234.5 km" (or "850 m", which is not counted)
+KM_PATTERN = re.compile(r'([\d,.]+)\s*km')
+
+# One keep-alive pool for the backend and Google calls, so reruns reuse open connections
+SESSION = requests.Session()
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8))
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=8))
+
+# Route lookups are repeated on every rerun (each widget interaction), so successful
+# responses are kept per session for a few seconds; creating a route clears its batch
+ROUTE_CACHE_TTL = 15
+
+def get_route_json(path, timeout=10, ttl=ROUTE_CACHE_TTL):
+    """GET a backend route endpoint, reusing this session's response for up to ttl seconds
+
+    Returns the parsed JSON, or None for a non-200 response (which is not cached).
+    """
+    cache = st.session_state.setdefault("_route_responses", {})
+    entry = cache.get(path)
+    now = time.monotonic()
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+    response = SESSION.get(f"{BACKEND_URL}{path}", timeout=timeout)
+    if response.status_code != 200:
+        return None
+    data = decode_json(response)
+    cache[path] = (now, data)
+    return data
+
+def invalidate_routes(batch_id):
+    """Drop cached route responses for a batch after it changes"""
+    st.session_state.get("_route_responses", {}).pop(f"/shipment/routes/{batch_id}", None)
+
+def latest_route_of(batch_id):
+    """Most recent route for a batch, taken from the (cached) full route list
+
+    The list is ordered by created_at, so its last entry is what /shipment/route/latest
+    returns; the journey view below reads the same cached list, so each render costs
+    one request at most. Returns None when there is no route or the lookup fails.
+    """
+    try:
+        routes_response = get_route_json(f"/shipment/routes/{batch_id}", timeout=10)
+    except Exception:
+        return None
+    routes = routes_response.get("routes", []) if routes_response else []
+    return routes[-1] if routes else None
+
+@functools.lru_cache(maxsize=2048)
 def decode_polyline(encoded_polyline):
-    """Decode Google Maps polyline to list of coordinates"""
+    """Decode Google Maps polyline to a tuple of (lat, lng) coordinates
+
+    Decoding is deterministic, so results are memoized per process and shared by every
+    session drawing the same route (tuples, so callers cannot mutate the cached value).
+    """
     try:
-        return polyline.decode(encoded_polyline)
+        if fast_decode_polyline is not None:
+            # pypolyline yields [lng, lat] pairs; folium wants (lat, lng)
+            return tuple((lat, lng) for lng, lat in fast_decode_polyline(encoded_polyline.encode("utf-8"), 5))
+        return tuple(polyline.decode(encoded_polyline))
     except:
-        return []
+        return ()
+
+def add_leg_markers(layer, route, start_color, end_color):
+    """Start and end markers for one leg (plain circles: no icon font or per-marker DivIcon)"""
+    folium.CircleMarker(
+        location=[route["from_lat"], route["from_lng"]],
+        radius=6,
+        color=start_color,
+        fill=True,
+        fill_opacity=0.9,
+        popup=f"<b>From:</b> {route['from_address']}<br><b>Time:</b> {route['created_at'][:19]}",
+        tooltip=f"Start: {route['from_address'][:30]}..."
+    ).add_to(layer)
+    
+    folium.CircleMarker(
+        location=[route["to_lat"], route["to_lng"]],
+        radius=6,
+        color=end_color,
+        fill=True,
+        fill_opacity=0.9,
+        popup=f"<b>To:</b> {route['to_address']}<br><b>Distance:</b> {route['distance']}<br><b>Duration:</b> {route['duration']}",
+        tooltip=f"End: {route['to_address'][:30]}..."
+    ).add_to(layer)
+
+# Past this many legs the start/end points are drawn as one client-side cluster layer
+# instead of individual markers (polylines are always drawn)
+CLUSTER_MARKERS_ABOVE = 20
 
 def create_route_map(routes_data, center_lat=None, center_lng=None):
     """
@@ -35,28 +136,24 @@ def create_route_map(routes_data, center_lat=None, center_lng=None):
     # Create map
     m = folium.Map(location=map_center, zoom_start=6)
     
-    # Colors for different route segments
+    # Colors for different route segments, and for the journey's first start / final end markers
     colors = ['blue', 'green', 'red', 'purple', 'orange', 'darkred', 'lightred', 'beige', 'darkblue', 'darkgreen']
+    n = len(routes_data)
+    route_colors = [colors[i % len(colors)] for i in range(n)]
+    start_colors = ['green'] + ['lightgray'] * (n - 1) if n else []
+    end_colors = ['gray'] * (n - 1) + ['blue'] if n else []
+    
+    # All markers and polylines go into one layer that is attached to the map once
+    route_layer = folium.FeatureGroup(name="routes")
+    
+    cluster_markers = n > CLUSTER_MARKERS_ABOVE
+    if cluster_markers:
+        points = [[r["from_lat"], r["from_lng"]] for r in routes_data] + [[r["to_lat"], r["to_lng"]] for r in routes_data]
+        FastMarkerCluster(points).add_to(m)
     
     for idx, route in enumerate(routes_data):
-        color = colors[idx % len(colors)]
-        
-        # Add start marker
-        folium.Marker(
-            location=[route["from_lat"], route["from_lng"]],
-            popup=f"<b>From:</b> {route['from_address']}<br><b>Time:</b> {route['created_at'][:19]}",
-            tooltip=f"Start: {route['from_address'][:30]}...",
-            icon=folium.Icon(color='green' if idx == 0 else 'lightgray', icon='play', prefix='fa')
-        ).add_to(m)
-        
-        # Add end marker
-        is_last = (idx == len(routes_data) - 1)
-        folium.Marker(
-            location=[route["to_lat"], route["to_lng"]],
-            popup=f"<b>To:</b> {route['to_address']}<br><b>Distance:</b> {route['distance']}<br><b>Duration:</b> {route['duration']}",
-            tooltip=f"End: {route['to_address'][:30]}...",
-            icon=folium.Icon(color='blue' if is_last else 'gray', icon='stop', prefix='fa')
-        ).add_to(m)
+        if not cluster_markers:
+            add_leg_markers(route_layer, route, start_colors[idx], end_colors[idx])
         
         # Decode and draw polyline
         if route.get("polyline"):
@@ -64,14 +161,115 @@ def create_route_map(routes_data, center_lat=None, center_lng=None):
             if coordinates:
                 folium.PolyLine(
                     locations=coordinates,
-                    color=color,
+                    color=route_colors[idx],
                     weight=4,
                     opacity=0.8,
                     popup=f"Route {idx+1}: {route['distance']} - {route['duration']}"
-                ).add_to(m)
+                ).add_to(route_layer)
     
+    route_layer.add_to(m)
     return m
 
+# Keyed by the routes themselves, so an entry never goes stale; persisting to disk keeps
+# the rendered maps across app restarts (no ttl: Streamlit ignores it for disk caches)
+@st.cache_data(persist="disk", max_entries=64, show_spinner=False)
+def route_map_html(routes_data):
+    """Standalone HTML for the route map, cached so reruns with the same routes skip
+    polyline decoding, marker construction and Leaflet generation"""
+    return create_route_map(routes_data).get_root().render()
+
+def show_route_map(routes_data, height=400):
+    """Render the route map (display only; no map interactions are read back)"""
+    components.html(route_map_html(routes_data), width=700, height=height)
+
+# Route histories show the most recent legs; older ones are rendered only on request
+RECENT_LEGS = 5
+
+def visible_legs(routes_data, key):
+    """(index, route) pairs to render: the last RECENT_LEGS, or all once the user opts in"""
+    older = len(routes_data) - RECENT_LEGS
+    if older > 0 and not st.checkbox(f"Show {older} older leg(s)", key=key):
+        return list(enumerate(routes_data))[older:]
+    return list(enumerate(routes_data))
+
+# A second submit this soon after the first is a double-click; dropping it saves a
+# duplicate route (and its Google API calls) on the backend
+SUBMIT_DEBOUNCE_SECONDS = 0.5
+
+def is_repeat_submit(form_key):
+    """True if this form was already submitted within SUBMIT_DEBOUNCE_SECONDS"""
+    state_key = f"_last_submit_{form_key}"
+    now = time.monotonic()
+    last = st.session_state.get(state_key, 0.0)
+    st.session_state[state_key] = now
+    return now - last < SUBMIT_DEBOUNCE_SECONDS
+
+# The browser's location rarely changes between route submissions
+AUTO_DETECT_TTL = 600
+
+def auto_detect_from_address():
+    """Resolve the current location to an address via the Geolocation and Geocoding APIs
+
+    A successful result is kept in session state for AUTO_DETECT_TTL seconds so repeated
+    submissions skip both Google calls. Returns None (after showing why) on failure.
+    """
+    cached = st.session_state.get("auto_detected_from")
+    if cached and time.monotonic() - cached["ts"] < AUTO_DETECT_TTL:
+        return cached["addr"]
+    
+    import os
+    from dotenv import load_dotenv
+    load_dotenv()
+    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+    if not GOOGLE_API_KEY:
+        return None
+    
+    # Get coordinates with increased timeout
+    try:
+        geo_response = SESSION.post(
+            "https://www.googleapis.com/geolocation/v1/geolocate",
+            params={"key": GOOGLE_API_KEY},
+            json={},
+            timeout=15
+        )
+    except requests.exceptions.Timeout:
+        st.error("⏱️ Location detection timed out. Please uncheck 'Auto-detect' and enter address manually.")
+        return None
+    except Exception as geo_error:
+        # The exception text can include the request URL, so only show its type
+        st.error(f"Location detection error: {type(geo_error).__name__}")
+        return None
+    
+    if geo_response.status_code != 200:
+        st.error(f"Geolocation API error: {geo_response.status_code}")
+        return None
+    geo_data = geo_response.json()
+    if "location" not in geo_data:
+        st.error("Could not get location from Geolocation API")
+        return None
+    lat = geo_data["location"]["lat"]
+    lng = geo_data["location"]["lng"]
+    
+    # Get address from coordinates
+    from_address = f"{lat},{lng}"
+    try:
+        geocode_response = SESSION.get(
+            "https://maps.googleapis.com/maps/api/geocode/json",
+            params={"latlng": f"{lat},{lng}", "key": GOOGLE_API_KEY},
+            timeout=15
+        )
+        if geocode_response.status_code == 200:
+            geocode_data = geocode_response.json()
+            if geocode_data.get("results"):
+                from_address = geocode_data["results"][0]["formatted_address"]
+    except requests.exceptions.Timeout:
+        st.warning("Geocoding timed out. Using coordinates only.")
+    except requests.exceptions.RequestException as geocode_error:
+        st.warning(f"Geocoding failed ({type(geocode_error).__name__}). Using coordinates only.")
+    
+    st.session_state["auto_detected_from"] = {"ts": time.monotonic(), "addr": from_address, "lat": lat, "lng": lng}
+    return from_address
+
 def manufacturer_navigation_tab(user_email, batch_ids):
     """
     Product Navigation tab for Manufacturer Dashboard
@@ -89,16 +287,11 @@ def manufacturer_navigation_tab(user_email, batch_ids):
     
     with col2:
         # Check if route already exists
-        try:
-            response = requests.get(f"{BACKEND_URL}/shipment/route/latest/{selected_batch}", timeout=5)
-            if response.status_code == 200:
-                latest_route = response.json().get("route")
-                if latest_route:
-                    st.info(f"📍 Last destination: {latest_route['to_address'][:50]}...")
-                else:
-                    st.info("🆕 No route set yet")
-        except:
-            pass
+        latest_route = latest_route_of(selected_batch)
+        if latest_route:
+            st.info(f"📍 Last destination: {latest_route['to_address'][:50]}...")
+        else:
+            st.info("🆕 No route set yet")
     
     st.markdown("---")
     
@@ -151,7 +344,9 @@ def manufacturer_navigation_tab(user_email, batch_ids):
         st.markdown("---")
         submit = st.form_submit_button("🚀 Generate Route", use_container_width=True, type="primary")
         
-        if submit:
+        if submit and is_repeat_submit("mfg_route_form"):
+            st.warning("Route request already sent - please wait")
+        elif submit:
             if not to_address:
                 st.error("Please enter a destination address")
             elif not use_auto_detect and not from_address_manual:
@@ -165,74 +360,15 @@ def manufacturer_navigation_tab(user_email, batch_ids):
                             from_address = from_address_manual.strip()
                             st.info(f"Using manually entered address: {from_address}")
                         elif use_auto_detect:
-                            # Get current location
-                            import os
-                            from dotenv import load_dotenv
-                            load_dotenv()
-                            GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
-                            
-                            if GOOGLE_API_KEY:
-                                # Get coordinates with increased timeout
-                                try:
-                                    geo_response = requests.post(
-                                        f"https://www.googleapis.com/geolocation/v1/geolocate?key={GOOGLE_API_KEY}",
-                                        json={},
-                                        timeout=15
-                                    )
-                                    
-                                    if geo_response.status_code == 200:
-                                        geo_data = geo_response.json()
-                                        if "location" in geo_data:
-                                            lat = geo_data["location"]["lat"]
-                                            lng = geo_data["location"]["lng"]
-                                            
-                                            # Get address from coordinates
-                                            try:
-                                                geocode_response = requests.get(
-                                                    f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lng}&key={GOOGLE_API_KEY}",
-                                                    timeout=15
-                                                )
-                                            except requests.exceptions.Timeout:
-                                                st.warning("Geocoding timed out. Using coordinates only.")
-                                                from_address = f"{lat},{lng}"
-                                                geocode_response = None
-                                        else:
-                                            st.error("Could not get location from Geolocation API")
-                                            from_address = "Auto-Detected"
-                                    else:
-                                        st.error(f"Geolocation API error: {geo_response.status_code}")
-                                        from_address = "Auto-Detected"
-                                except requests.exceptions.Timeout:
-                                    st.error("⏱️ Location detection timed out. Please uncheck 'Auto-detect' and enter address manually.")
-                                    from_address = None
-                                    geo_response = None
-                                except Exception as geo_error:
-                                    st.error(f"Location detection error: {str(geo_error)}")
-                                    from_address = None
-                                    geo_response = None
-                                
-                                # Only proceed if we have geo_response
-                                if geo_response and geo_response.status_code == 200:
-                                    if geocode_response and geocode_response.status_code == 200:
-                                        geocode_data = geocode_response.json()
-                                        if geocode_data.get("results"):
-                                            from_address = geocode_data["results"][0]["formatted_address"]
-                                        else:
-                                            from_address = f"{lat},{lng}"
-                                    else:
-                                        from_address = f"{lat},{lng}"
-                                else:
-                                    # Auto-detect failed
-                                    if from_address is None:
-                                        st.error("Auto-detection failed. Please uncheck 'Auto-detect' and enter address manually.")
-                                from_address = None
+                            # Get current location (reused for a few minutes across submissions)
+                            from_address = auto_detect_from_address()
                         else:
                             # Use manual address
                             from_address = from_address_manual
                         
                         # Only create route if we have a from_address
                         if not from_address:
-                            st.error("Could not determine starting address. Please try again or enter manually.")
+                            st.warning("⚠️ Could not determine the starting address. Uncheck 'Auto-detect' and enter the From address manually.")
                         else:
                             # Create route
                             route_data = {
@@ -242,13 +378,14 @@ def manufacturer_navigation_tab(user_email, batch_ids):
                                 "updated_by": user_email
                             }
                             
-                            response = requests.post(
+                            response = SESSION.post(
                                 f"{BACKEND_URL}/shipment/route",
                                 json=route_data,
                                 timeout=15
                             )
                             
                             if response.status_code == 200:
+                                invalidate_routes(selected_batch)
                                 result = response.json()
                                 route_details = result.get("route_details", {})
                                 
@@ -275,18 +412,17 @@ def manufacturer_navigation_tab(user_email, batch_ids):
     st.markdown("### 🗺️ Current Route")
     
     try:
-        response = requests.get(f"{BACKEND_URL}/shipment/routes/{selected_batch}", timeout=10)
-        if response.status_code == 200:
-            routes_data = response.json().get("routes", [])
+        routes_response = get_route_json(f"/shipment/routes/{selected_batch}", timeout=10)
+        if routes_response is not None:
+            routes_data = routes_response.get("routes", [])
             
             if routes_data:
                 # Show map with reduced height
-                route_map = create_route_map(routes_data)
-                st_folium(route_map, width=700, height=400, returned_objects=[])
+                show_route_map(routes_data)
                 
                 # Show route details immediately after map (no gap)
                 st.markdown("#### 📋 Route History")
-                for idx, route in enumerate(routes_data):
+                for idx, route in visible_legs(routes_data, key="mfg_show_older_legs"):
                     with st.expander(f"Route {idx+1}: {route['from_address'][:40]}... → {route['to_address'][:40]}...", expanded=(idx == len(routes_data)-1)):
                         col1, col2, col3 = st.columns(3)
                         with col1:
@@ -322,16 +458,11 @@ def distributor_navigation_tab(user_email, batch_ids):
     
     with col2:
         # Get latest route
-        try:
-            response = requests.get(f"{BACKEND_URL}/shipment/route/latest/{selected_batch}", timeout=5)
-            if response.status_code == 200:
-                latest_route = response.json().get("route")
-                if latest_route:
-                    st.success(f"📍 Current location: {latest_route['to_address'][:50]}...")
-                else:
-                    st.warning("⚠️ No route set yet")
-        except:
-            pass
+        latest_route = latest_route_of(selected_batch)
+        if latest_route:
+            st.success(f"📍 Current location: {latest_route['to_address'][:50]}...")
+        else:
+            st.warning("⚠️ No route set yet")
     
     st.markdown("---")
     
@@ -339,15 +470,7 @@ def distributor_navigation_tab(user_email, batch_ids):
         st.markdown("#### Update Route to Next Destination")
         
         # Get last destination as new "From"
-        last_destination = None
-        try:
-            response = requests.get(f"{BACKEND_URL}/shipment/route/latest/{selected_batch}", timeout=5)
-            if response.status_code == 200:
-                latest_route = response.json().get("route")
-                if latest_route:
-                    last_destination = latest_route['to_address']
-        except:
-            pass
+        last_destination = latest_route['to_address'] if latest_route else None
         
         # Two-way method for From Address
         st.markdown("**📍 From Address (Starting Point)**")
@@ -397,7 +520,9 @@ def distributor_navigation_tab(user_email, batch_ids):
         st.markdown("---")
         submit = st.form_submit_button("🚀 Update Route", use_container_width=True, type="primary")
         
-        if submit:
+        if submit and is_repeat_submit("dist_route_form"):
+            st.warning("Route request already sent - please wait")
+        elif submit:
             if not to_address:
                 st.error("Please enter a destination address")
             elif not use_last_destination and not from_address_manual:
@@ -425,13 +550,14 @@ def distributor_navigation_tab(user_email, batch_ids):
                                 "updated_by": user_email
                             }
                             
-                            response = requests.post(
+                            response = SESSION.post(
                                 f"{BACKEND_URL}/shipment/route",
                                 json=route_data,
                                 timeout=15
                             )
                             
                             if response.status_code == 200:
+                                invalidate_routes(selected_batch)
                                 result = response.json()
                                 route_details = result.get("route_details", {})
                                 
@@ -455,18 +581,17 @@ def distributor_navigation_tab(user_email, batch_ids):
     st.markdown("### 🗺️ Complete Journey")
     
     try:
-        response = requests.get(f"{BACKEND_URL}/shipment/routes/{selected_batch}", timeout=10)
-        if response.status_code == 200:
-            routes_data = response.json().get("routes", [])
+        routes_response = get_route_json(f"/shipment/routes/{selected_batch}", timeout=10)
+        if routes_response is not None:
+            routes_data = routes_response.get("routes", [])
             
             if routes_data:
                 # Show map with reduced height
-                route_map = create_route_map(routes_data)
-                st_folium(route_map, width=700, height=400, returned_objects=[])
+                show_route_map(routes_data)
                 
                 # Show route details immediately after map
                 st.markdown("#### 📋 Route History")
-                for idx, route in enumerate(routes_data):
+                for idx, route in visible_legs(routes_data, key="dist_show_older_legs"):
                     with st.expander(f"Leg {idx+1}: {route['from_address'][:40]}... → {route['to_address'][:40]}...", expanded=(idx == len(routes_data)-1)):
                         col1, col2, col3 = st.columns(3)
                         with col1:
@@ -505,9 +630,9 @@ def fda_navigation_tab(batch_ids):
         if st.button("🔍 Verify Route Integrity", use_container_width=True):
             with st.spinner("Verifying..."):
                 try:
-                    response = requests.get(f"{BACKEND_URL}/shipment/route/verify/{selected_batch}", timeout=10)
+                    response = SESSION.get(f"{BACKEND_URL}/shipment/route/verify/{selected_batch}", timeout=10)
                     if response.status_code == 200:
-                        result = response.json()
+                        result = decode_json(response)
                         
                         if result["is_valid"]:
                             st.success(f"✅ Route integrity verified - {result['total_routes']} route(s)")
@@ -528,31 +653,27 @@ def fda_navigation_tab(batch_ids):
     st.markdown("### 🗺️ Complete Journey Map")
     
     try:
-        response = requests.get(f"{BACKEND_URL}/shipment/routes/{selected_batch}", timeout=5)
-        if response.status_code == 200:
-            routes_data = response.json().get("routes", [])
+        routes_response = get_route_json(f"/shipment/routes/{selected_batch}", timeout=5)
+        if routes_response is not None:
+            routes_data = routes_response.get("routes", [])
             
             if routes_data:
                 # Show map with reduced height
-                route_map = create_route_map(routes_data)
-                st_folium(route_map, width=700, height=400, returned_objects=[])
+                show_route_map(routes_data)
                 
                 # Show route details in table format
                 st.markdown("#### Route Details")
                 
                 import pandas as pd
-                df = pd.DataFrame([
-                    {
-                        "Leg": idx+1,
-                        "From": r["from_address"][:50],
-                        "To": r["to_address"][:50],
-                        "Distance": r["distance"],
-                        "Duration": r["duration"],
-                        "Status": r["status"].upper(),
-                        "Updated": r["created_at"][:19]
-                    }
-                    for idx, r in enumerate(routes_data)
-                ])
+                df = pd.DataFrame({
+                    "Leg": range(1, len(routes_data) + 1),
+                    "From": [r["from_address"][:50] for r in routes_data],
+                    "To": [r["to_address"][:50] for r in routes_data],
+                    "Distance": [r["distance"] for r in routes_data],
+                    "Duration": [r["duration"] for r in routes_data],
+                    "Status": [r["status"].upper() for r in routes_data],
+                    "Updated": [r["created_at"][:19] for r in routes_data]
+                })
                 
                 st.dataframe(df, use_container_width=True)
             else:
@@ -576,20 +697,19 @@ def pharmacy_navigation_tab(batch_ids):
     st.markdown("---")
     
     try:
-        response = requests.get(f"{BACKEND_URL}/shipment/routes/{selected_batch}", timeout=5)
-        if response.status_code == 200:
-            routes_data = response.json().get("routes", [])
+        routes_response = get_route_json(f"/shipment/routes/{selected_batch}", timeout=5)
+        if routes_response is not None:
+            routes_data = routes_response.get("routes", [])
             
             if routes_data:
                 # Show complete journey map
                 st.markdown("### 🗺️ Complete Supply Chain Journey")
-                route_map = create_route_map(routes_data)
-                st_folium(route_map, width=700, height=450, returned_objects=[])
+                show_route_map(routes_data, height=450)
                 
                 # Show timeline
                 st.markdown("### 📅 Journey Timeline")
                 
-                for idx, route in enumerate(routes_data):
+                for idx, route in visible_legs(routes_data, key="pharm_show_older_legs"):
                     stage_name = ["Manufacturer", "Distributor", "FDA", "Pharmacy"][min(idx, 3)]
                     
                     with st.expander(f"Stage {idx+1}: {stage_name} - {route['created_at'][:19]}", expanded=True):
@@ -619,7 +739,8 @@ def pharmacy_navigation_tab(batch_ids):
                 
                 with col2:
                     # Calculate total distance (rough estimate)
-                    total_km = sum([float(r['distance'].replace(' km', '').replace(',', '')) for r in routes_data if 'km' in r['distance']])
+                    km_matches = (KM_PATTERN.search(r['distance']) for r in routes_data)
+                    total_km = np.fromiter((float(m.group(1).replace(',', '')) for m in km_matches if m), dtype=np.float64).sum()
                     st.metric("Total Distance", f"{total_km:.1f} km")
                 
                 with col3:
@@ -0,0 +1,37 @@
+-- Appends a block to a batch's hash chain in one call, used by add_to_ledger()
+-- The block is inserted only if its prev_hash is still the batch's latest curr_hash;
+-- otherwise nothing is written and {"conflict": true, "head": <latest curr_hash>} is
+-- returned so the caller can rehash against the real head and retry.
+-- The advisory lock serializes appends per batch so two writers cannot fork the chain
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION append_ledger(p_entry JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    head TEXT;
+    inserted ledger;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('ledger:' || (p_entry->>'batch_id')));
+
+    SELECT l.curr_hash INTO head
+    FROM ledger l
+    WHERE l.batch_id = p_entry->>'batch_id'
+    ORDER BY l.timestamp DESC
+    LIMIT 1;
+
+    head := COALESCE(head, REPEAT('0', 64));
+
+    IF head IS DISTINCT FROM p_entry->>'prev_hash' THEN
+        RETURN jsonb_build_object('conflict', true, 'head', head);
+    END IF;
+
+    INSERT INTO ledger (batch_id, event, actor_role, actor_email, "timestamp", prev_hash, data, curr_hash)
+    SELECT e.batch_id, e.event, e.actor_role, e.actor_email, e."timestamp", e.prev_hash, e.data, e.curr_hash
+    FROM jsonb_populate_record(NULL::ledger, p_entry) e
+    RETURNING * INTO inserted;
+
+    RETURN to_jsonb(inserted);
+END;
+$$;
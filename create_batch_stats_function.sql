@@ -0,0 +1,18 @@
+-- Temperature compliance counts used by GET /batch/{batch_id}/stats
+-- Returns the record total and the number of readings outside [min_temp, max_temp]
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION batch_stats(bid TEXT, min_temp DOUBLE PRECISION, max_temp DOUBLE PRECISION)
+RETURNS TABLE (
+    total_records BIGINT,
+    temperature_violations BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE temperature < min_temp OR temperature > max_temp)
+    FROM iot_data
+    WHERE batch_id = bid;
+$$;
@@ -0,0 +1,22 @@
+-- Current shipment status per batch, used by POST /batch/status and GET /batch/{batch_id}/status
+-- Replaces the "Status: ..." / STATUS_UPDATE_BY_* marker rows in iot_data; the INSERT below
+-- carries over the latest marker of every batch that already has one
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE TABLE IF NOT EXISTS batch_status (
+    batch_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    updated_by TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+INSERT INTO batch_status (batch_id, status, updated_by, updated_at)
+SELECT DISTINCT ON (batch_id)
+    batch_id,
+    REPLACE(location, 'Status: ', ''),
+    REPLACE(sensor_id, 'STATUS_UPDATE_BY_', ''),
+    timestamp
+FROM iot_data
+WHERE location LIKE 'Status:%'
+ORDER BY batch_id, timestamp DESC
+ON CONFLICT (batch_id) DO NOTHING;
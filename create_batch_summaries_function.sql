@@ -0,0 +1,26 @@
+-- Per-batch IoT summary used by GET /batches
+-- Returns the latest reading and total record count for every batch in one query
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION get_batch_summaries()
+RETURNS TABLE (
+    batch_id TEXT,
+    latest_temperature DOUBLE PRECISION,
+    latest_humidity DOUBLE PRECISION,
+    location TEXT,
+    last_update TIMESTAMPTZ,
+    record_count BIGINT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT DISTINCT ON (d.batch_id)
+        d.batch_id,
+        d.temperature,
+        d.humidity,
+        d.location,
+        d.timestamp,
+        COUNT(*) OVER (PARTITION BY d.batch_id)
+    FROM iot_data d
+    ORDER BY d.batch_id, d.timestamp DESC;
+$$;
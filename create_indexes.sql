@@ -0,0 +1,59 @@
+-- Indexes for the API's hot query paths
+-- Run this in Supabase Dashboard → SQL Editor
+-- CONCURRENTLY avoids locking writes; run each statement on its own (not inside a transaction)
+
+-- GET /iot/data/{batch_id}, /batch/{batch_id}/status, latest-reading lookups:
+--   WHERE batch_id = ? ORDER BY timestamp DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS iot_data_batch_ts_idx
+    ON iot_data (batch_id, timestamp DESC);
+
+-- GET /alerts: ORDER BY timestamp DESC LIMIT n
+CREATE INDEX CONCURRENTLY IF NOT EXISTS alerts_ts_idx
+    ON alerts (timestamp DESC);
+
+-- GET /batch/{batch_id}/status: latest "Status: ..." marker row per batch
+--   WHERE batch_id = ? AND location LIKE 'Status:%' ORDER BY timestamp DESC LIMIT 1
+-- (partial, so it only holds the few status rows rather than every reading)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS iot_data_status_idx
+    ON iot_data (batch_id, timestamp DESC) WHERE location LIKE 'Status:%';
+
+-- GET /iot/data: ORDER BY timestamp DESC LIMIT n across all batches
+CREATE INDEX CONCURRENTLY IF NOT EXISTS iot_data_ts_idx
+    ON iot_data (timestamp DESC);
+
+-- GET /ledger/{batch_id}, add_to_ledger's previous-hash lookup, /ledger/verify/all:
+--   WHERE batch_id = ? ORDER BY timestamp (either direction)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ledger_batch_ts_idx
+    ON ledger (batch_id, timestamp);
+
+-- GET /batch/pending: WHERE status = 'pending' ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS batches_status_created_idx
+    ON batches (status, created_at DESC);
+
+-- GET /batch/all: ORDER BY created_at DESC LIMIT 100
+CREATE INDEX CONCURRENTLY IF NOT EXISTS batches_created_idx
+    ON batches (created_at DESC);
+
+-- GET /alerts/realtime: WHERE acknowledged = false ORDER BY timestamp DESC LIMIT n
+-- (partial, so acknowledged history does not grow the index)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS alerts_log_unack_ts_idx
+    ON alerts_log (timestamp DESC) WHERE acknowledged = false;
+
+-- GET /audit/logs?batch_id=: WHERE batch_id = ? ORDER BY timestamp DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS audit_logs_batch_ts_idx
+    ON audit_logs (batch_id, timestamp DESC);
+
+-- Shipment route history and latest-route lookups: WHERE batch_id = ? ORDER BY created_at
+-- (ascending for history/verify; the DESC LIMIT 1 latest-route queries scan it backward)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS shipment_routes_batch_created_idx
+    ON shipment_routes (batch_id, created_at);
+
+-- check_latest_data.py ESP32 readings: WHERE sensor_id = ? ORDER BY timestamp DESC LIMIT n
+CREATE INDEX CONCURRENTLY IF NOT EXISTS iot_data_sensor_ts_idx
+    ON iot_data (sensor_id, timestamp DESC);
+
+-- Check the planner picks them up, e.g.:
+-- EXPLAIN ANALYZE SELECT * FROM iot_data WHERE batch_id = 'BATCH-2025-001' ORDER BY timestamp DESC;
+-- EXPLAIN ANALYZE SELECT * FROM ledger WHERE batch_id = 'BATCH-2025-001' ORDER BY timestamp;
+-- EXPLAIN ANALYZE SELECT * FROM batches WHERE status = 'pending' ORDER BY created_at DESC;
+-- EXPLAIN ANALYZE SELECT id FROM shipment_routes WHERE batch_id = 'BATCH-2025-001' ORDER BY created_at DESC LIMIT 1;
@@ -0,0 +1,32 @@
+-- Stores an out-of-range reading and its alert in one call, used by POST /iot/data
+-- p_reading is the iot_data row, p_alert the alerts row; the alerts_log copy is skipped
+-- if that table does not exist. Returns the inserted iot_data row
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION insert_iot_with_alert(p_reading JSONB, p_alert JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    inserted iot_data;
+BEGIN
+    INSERT INTO iot_data (batch_id, temperature, humidity, location, sensor_id, "timestamp", blockchain_hash, is_alert)
+    SELECT r.batch_id, r.temperature, r.humidity, r.location, r.sensor_id, r."timestamp", r.blockchain_hash, r.is_alert
+    FROM jsonb_populate_record(NULL::iot_data, p_reading) r
+    RETURNING * INTO inserted;
+
+    INSERT INTO alerts (batch_id, alert_type, severity, message, "timestamp", temperature, location)
+    SELECT a.batch_id, a.alert_type, a.severity, a.message, a."timestamp", a.temperature, a.location
+    FROM jsonb_populate_record(NULL::alerts, p_alert) a;
+
+    BEGIN
+        INSERT INTO alerts_log (batch_id, alert_type, severity, message, "timestamp", temperature, location)
+        SELECT a.batch_id, a.alert_type, a.severity, a.message, a."timestamp", a.temperature, a.location
+        FROM jsonb_populate_record(NULL::alerts, p_alert) a;
+    EXCEPTION WHEN undefined_table THEN
+        NULL;
+    END;
+
+    RETURN to_jsonb(inserted);
+END;
+$$;
@@ -0,0 +1,37 @@
+-- Bucketed min/avg/max series used by GET /iot/aggregate
+-- Readings since `since` are grouped per batch into fixed bucket_seconds windows, so the
+-- dashboard receives one row per bucket instead of every raw sample
+-- Pass bid = NULL for all batches
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION iot_aggregate(bid TEXT, bucket_seconds INTEGER, since TIMESTAMPTZ)
+RETURNS TABLE (
+    batch_id TEXT,
+    bucket TIMESTAMPTZ,
+    readings BIGINT,
+    temperature_avg DOUBLE PRECISION,
+    temperature_min DOUBLE PRECISION,
+    temperature_max DOUBLE PRECISION,
+    humidity_avg DOUBLE PRECISION,
+    humidity_min DOUBLE PRECISION,
+    humidity_max DOUBLE PRECISION
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        d.batch_id::TEXT,
+        date_bin(make_interval(secs => bucket_seconds), d."timestamp"::TIMESTAMPTZ, TIMESTAMPTZ 'epoch') AS bucket,
+        COUNT(*),
+        AVG(d.temperature)::DOUBLE PRECISION,
+        MIN(d.temperature)::DOUBLE PRECISION,
+        MAX(d.temperature)::DOUBLE PRECISION,
+        AVG(d.humidity)::DOUBLE PRECISION,
+        MIN(d.humidity)::DOUBLE PRECISION,
+        MAX(d.humidity)::DOUBLE PRECISION
+    FROM iot_data d
+    WHERE (bid IS NULL OR d.batch_id = bid)
+      AND d."timestamp"::TIMESTAMPTZ >= since
+    GROUP BY 1, 2
+    ORDER BY 2, 1;
+$$;
@@ -0,0 +1,26 @@
+-- Hash-chain check for one batch, used by GET /ledger/{batch_id}/verify
+-- Returns only the blocks whose prev_hash does not match the previous block's curr_hash,
+-- so an intact chain comes back as zero rows
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION ledger_tampered(bid TEXT)
+RETURNS TABLE (
+    idx INTEGER,
+    ts TIMESTAMPTZ
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT c.block_index, c.timestamp
+    FROM (
+        SELECT
+            l.timestamp,
+            l.prev_hash,
+            LAG(l.curr_hash) OVER (ORDER BY l.timestamp) AS prev_curr_hash,
+            (ROW_NUMBER() OVER (ORDER BY l.timestamp) - 1)::INTEGER AS block_index
+        FROM ledger l
+        WHERE l.batch_id = bid
+    ) c
+    WHERE c.block_index > 0 AND c.prev_hash IS DISTINCT FROM c.prev_curr_hash
+    ORDER BY c.block_index;
+$$;
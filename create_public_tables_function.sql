@@ -0,0 +1,17 @@
+-- Table names in the public schema, used by the probe scripts (test_connection.py, ...)
+-- Lets them check which tables exist with one query instead of one select per table
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION public_tables()
+RETURNS TABLE (
+    table_name TEXT
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT t.table_name::TEXT
+    FROM information_schema.tables t
+    WHERE t.table_schema = 'public'
+      AND t.table_type = 'BASE TABLE'
+    ORDER BY 1;
+$$;
@@ -0,0 +1,43 @@
+-- Per-hop integrity flags for one batch's shipment routes, used by GET /shipment/route/verify/{batch_id}
+-- Missing-field and continuity checks run next to the data (LAG over the previous hop),
+-- and only the summary columns come back, not the polylines
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION route_integrity(bid TEXT)
+RETURNS TABLE (
+    from_address TEXT,
+    to_address TEXT,
+    distance TEXT,
+    duration TEXT,
+    created_at TIMESTAMPTZ,
+    missing_address BOOLEAN,
+    missing_metrics BOOLEAN,
+    discontinuous BOOLEAN
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        r.from_address::TEXT,
+        r.to_address::TEXT,
+        r.distance::TEXT,
+        r.duration::TEXT,
+        r.created_at::TIMESTAMPTZ,
+        COALESCE(r.from_address, '') = '' OR COALESCE(r.to_address, '') = '',
+        COALESCE(r.distance, '') = '' OR COALESCE(r.duration, '') = '',
+        -- ~11 km tolerance; hops without coordinates are not compared
+        COALESCE(
+            r.from_lat <> 0 AND r.prev_to_lat <> 0
+                AND (ABS(r.from_lat - r.prev_to_lat) > 0.1 OR ABS(r.from_lng - r.prev_to_lng) > 0.1),
+            FALSE
+        )
+    FROM (
+        SELECT
+            s.*,
+            LAG(s.to_lat) OVER (ORDER BY s.created_at) AS prev_to_lat,
+            LAG(s.to_lng) OVER (ORDER BY s.created_at) AS prev_to_lng
+        FROM shipment_routes s
+        WHERE s.batch_id = bid
+    ) r
+    ORDER BY r.created_at;
+$$;
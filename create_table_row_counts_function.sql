@@ -0,0 +1,41 @@
+-- Existence and row count for each named table, used by verify_tables.py
+-- Checks every table in one call instead of one count request per table;
+-- names that are not tables in the public schema come back with table_exists = FALSE.
+-- Large tables report the planner's estimate (pg_class.reltuples) instead of scanning
+-- with COUNT(*); tables below exact_below rows, or never analyzed, are counted exactly
+-- Run this in Supabase Dashboard → SQL Editor
+
+DROP FUNCTION IF EXISTS table_row_counts(TEXT[]);
+
+CREATE OR REPLACE FUNCTION table_row_counts(names TEXT[], exact_below BIGINT DEFAULT 100000)
+RETURNS TABLE (
+    table_name TEXT,
+    table_exists BOOLEAN,
+    row_count BIGINT
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    n TEXT;
+    rel REGCLASS;
+    estimate BIGINT;
+    c BIGINT;
+BEGIN
+    FOREACH n IN ARRAY names LOOP
+        rel := to_regclass(format('public.%I', n));
+        IF rel IS NULL THEN
+            RETURN QUERY SELECT n, FALSE, 0::BIGINT;
+            CONTINUE;
+        END IF;
+        -- reltuples is -1 until the table has been vacuumed or analyzed
+        SELECT pc.reltuples::BIGINT INTO estimate FROM pg_class pc WHERE pc.oid = rel;
+        IF estimate >= exact_below THEN
+            c := estimate;
+        ELSE
+            EXECUTE format('SELECT COUNT(*) FROM %s', rel) INTO c;
+        END IF;
+        RETURN QUERY SELECT n, TRUE, c;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,20 @@
+-- Status change for a batch's latest shipment route in one statement, used by POST /shipment/route/status
+-- Returns the updated row, or no rows when the batch has no route
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION update_latest_route_status(p_batch_id TEXT, p_status TEXT)
+RETURNS SETOF shipment_routes
+LANGUAGE sql
+AS $$
+    UPDATE shipment_routes
+    SET status = p_status,
+        last_updated = NOW()
+    WHERE id = (
+        SELECT id
+        FROM shipment_routes
+        WHERE batch_id = p_batch_id
+        ORDER BY created_at DESC
+        LIMIT 1
+    )
+    RETURNING *;
+$$;
@@ -0,0 +1,31 @@
+-- Hash-chain check for every batch in the ledger, used by GET /ledger/verify/all
+-- Compares each block's prev_hash with the previous block's curr_hash in one query
+-- Run this in Supabase Dashboard → SQL Editor
+
+CREATE OR REPLACE FUNCTION verify_ledger_chains()
+RETURNS TABLE (
+    batch_id TEXT,
+    total_blocks BIGINT,
+    tampered_blocks INTEGER[]
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        c.batch_id,
+        COUNT(*),
+        COALESCE(
+            ARRAY_AGG(c.block_index ORDER BY c.block_index)
+                FILTER (WHERE c.block_index > 0 AND c.prev_hash IS DISTINCT FROM c.prev_curr_hash),
+            '{}'
+        )
+    FROM (
+        SELECT
+            l.batch_id,
+            l.prev_hash,
+            LAG(l.curr_hash) OVER (PARTITION BY l.batch_id ORDER BY l.timestamp) AS prev_curr_hash,
+            (ROW_NUMBER() OVER (PARTITION BY l.batch_id ORDER BY l.timestamp) - 1)::INTEGER AS block_index
+        FROM ledger l
+    ) c
+    GROUP BY c.batch_id;
+$$;
@@ -0,0 +1,23 @@
+"""
+Table existence checks shared by the database probe scripts
+public_tables() (create_public_tables_function.sql) lists every table in one query;
+without it each table is probed with a one-column, one-row select
+"""
+
+def probe_tables(supabase, names):
+    """Map each table name to None if it exists, or to the error explaining why not"""
+    try:
+        found = {row["table_name"] for row in supabase.rpc("public_tables").execute().data}
+        return {name: None if name in found else "Table does not exist" for name in names}
+    except Exception:
+        pass
+    
+    # Function not installed - probe the tables one by one
+    results = {}
+    for name in names:
+        try:
+            supabase.table(name).select("id").limit(1).execute()
+            results[name] = None
+        except Exception as e:
+            results[name] = str(e)
+    return results
@@ -0,0 +1,105 @@
+"""
+One-shot health check for the whole stack
+Runs the read-only checks from the test_* scripts side by side (Supabase tables, backend,
+audit logs, Google APIs through the backend and directly) and prints one summary table
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from supabase import create_client
+from db_tables import probe_tables
+
+load_dotenv()
+
+BACKEND_URL = "http://localhost:8000"
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+REQUIRED_TABLES = ["iot_data", "alerts", "batches", "user_profiles", "ledger", "audit_logs", "shipment_routes"]
+
+def check_supabase_tables(session):
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        return False, "SUPABASE_URL / SUPABASE_KEY not set"
+    tables = probe_tables(create_client(SUPABASE_URL, SUPABASE_KEY), REQUIRED_TABLES)
+    missing = [name for name, error in tables.items() if error is not None]
+    if missing:
+        return False, f"missing: {', '.join(missing)}"
+    return True, f"{len(tables)} tables present"
+
+def check_backend(session):
+    health = session.get(f"{BACKEND_URL}/health", timeout=5).json()
+    return health.get("status") == "healthy", f"status={health.get('status')}, google_maps={health.get('google_maps', 'unknown')}"
+
+def check_audit_logs(session):
+    response = session.get(f"{BACKEND_URL}/audit/logs", params={"limit": 1}, timeout=10)
+    if response.status_code != 200:
+        return False, f"HTTP {response.status_code}"
+    return True, f"{len(response.json().get('logs', []))} latest entry readable"
+
+def check_backend_geocoding(session):
+    response = session.get(f"{BACKEND_URL}/geocode", params={"address": "Mumbai, India"}, timeout=10)
+    if response.status_code != 200:
+        return False, f"HTTP {response.status_code}"
+    return True, response.json().get("formatted_address", "")
+
+def check_backend_directions(session):
+    response = session.get(f"{BACKEND_URL}/route", params={"origin": "Chennai", "destination": "Bengaluru"}, timeout=10)
+    if response.status_code != 200:
+        return False, f"HTTP {response.status_code}"
+    routes = response.json().get("route", {}).get("routes")
+    if not routes:
+        return False, "no routes found"
+    leg = routes[0]["legs"][0]
+    return True, f"{leg['distance']['text']}, {leg['duration']['text']}"
+
+def check_google_geocoding(session):
+    if not GOOGLE_API_KEY:
+        return False, "GOOGLE_API_KEY not set"
+    data = session.get("https://maps.googleapis.com/maps/api/geocode/json",
+                       params={"latlng": "9.5793,77.6658", "key": GOOGLE_API_KEY}, timeout=5).json()
+    if data.get("status") != "OK":
+        return False, f"{data.get('status')}: {data.get('error_message', '')}"
+    return True, data["results"][0]["formatted_address"]
+
+CHECKS = [
+    check_supabase_tables,
+    check_backend,
+    check_audit_logs,
+    check_backend_geocoding,
+    check_backend_directions,
+    check_google_geocoding,
+]
+
+def run_check(check, session):
+    started = time.perf_counter()
+    try:
+        ok, detail = check(session)
+    except Exception as e:
+        ok, detail = False, str(e)
+    return check.__name__.removeprefix("check_"), ok, detail, time.perf_counter() - started
+
+def main():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=len(CHECKS))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(CHECKS)) as executor:
+        results = list(executor.map(lambda check: run_check(check, session), CHECKS))
+    elapsed = time.perf_counter() - started
+
+    print("=" * 90)
+    print("PharmaChain Health Check")
+    print("=" * 90)
+    for name, ok, detail, seconds in results:
+        print(f"{'✅' if ok else '❌'} {name:20} {seconds:5.2f}s  {detail[:55]}")
+    print("=" * 90)
+    print(f"{sum(ok for _, ok, _, _ in results)}/{len(results)} checks passed in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ Run this script to set up everything automatically
 import subprocess
 import sys
 import os
+from importlib.util import find_spec
 from supabase import create_client
 from dotenv import load_dotenv
 
@@ -14,9 +15,17 @@ print("=" * 70)
 
 # Step 1: Install Python dependencies
 print("\n📦 Step 1: Installing Python dependencies...")
+# import name -> pip requirement installed when the module is missing
+REQUIRED_PACKAGES = {"folium": "folium==0.15.1", "streamlit_folium": "streamlit-folium==0.15.1", "polyline": "polyline==2.0.0"}
+
 try:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "folium==0.15.1", "streamlit-folium==0.15.1", "polyline==2.0.0"])
-    print("✅ Dependencies installed successfully!")
+    # Only run pip for modules that cannot be imported; existing (possibly newer) installs are kept
+    missing = [requirement for module, requirement in REQUIRED_PACKAGES.items() if find_spec(module) is None]
+    if missing:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "--no-input", "--disable-pip-version-check", *missing])
+        print("✅ Dependencies installed successfully!")
+    else:
+        print("✅ Dependencies already installed!")
 except Exception as e:
     print(f"❌ Error installing dependencies: {e}")
     sys.exit(1)
@@ -0,0 +1,8 @@
+-- Store iot_data.blockchain_hash as 32 raw bytes instead of 64 hex characters
+-- Run this in Supabase Dashboard → SQL Editor, then set BLOCKCHAIN_HASH_FORMAT=bytea
+-- in the backend's .env and restart it
+-- PostgREST still exchanges the column as a "\x"-prefixed hex string
+
+ALTER TABLE iot_data
+    ALTER COLUMN blockchain_hash TYPE BYTEA
+    USING decode(blockchain_hash, 'hex');
@@ -4,15 +4,39 @@ Displays live temperature and humidity data with auto-refresh
 """
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-import time
+from streamlit_autorefresh import st_autorefresh
+
+# Decode backend responses with orjson when it is installed (the API already encodes with it)
+try:
+    import orjson
+
+    def decode_json(response):
+        return orjson.loads(response.content)
+except ImportError:
+    def decode_json(response):
+        return response.json()
 
 # Configuration
 BACKEND_URL = "http://localhost:8000"
 REFRESH_INTERVAL = 10  # seconds
+# After more than FAILURES_BEFORE_BACKOFF failed fetches in a row the refresh interval
+# doubles per failure, up to MAX_REFRESH_INTERVAL, until the backend answers again
+FAILURES_BEFORE_BACKOFF = 2
+MAX_REFRESH_INTERVAL = 60  # seconds
+# (connect, read) seconds; a stopped backend refuses the connection quickly
+REQUEST_TIMEOUT = (2, 5)
+# The charts plot per-minute min/avg/max buckets from /iot/aggregate over this window
+CHART_BUCKET = "1m"
+CHART_HOURS = 2
+# Readings kept per session for the metrics and table; refreshes only fetch newer rows
+MAX_READINGS = 1000
+# Raw readings are averaged into windows of this size before plotting
+PLOT_RESAMPLE = "30s"
 
 # Page config
 st.set_page_config(
@@ -56,235 +80,269 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def fetch_iot_data():
-    """Fetch IoT data from FastAPI backend"""
+# Card markup for the alerts and system log panels; each panel is rendered as one joined string
+ALERT_CARD = """<div class="{alert_class}">
+<strong>🚨 {alert_type}</strong><br>
+Batch: {batch_id} | Temp: {temperature}°C<br>
+Location: {location} | Time: {time}<br>
+{message}
+</div>
+"""
+
+LOG_ENTRY = """<div class="log-entry">
+<strong>[{time}]</strong> {title}<br>
+<small>{detail}</small>
+</div>
+"""
+
+@st.cache_resource
+def http_session():
+    """Keep-alive session shared across reruns so each refresh reuses the backend connection"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])))
+    return session
+
+# Cached just under the refresh interval so every tab open on the dashboard shares one backend hit
+@st.cache_data(ttl=REFRESH_INTERVAL - 1, show_spinner=False)
+def fetch_iot_data(after_id=None):
+    """Fetch IoT data from FastAPI backend (only rows newer than after_id when given)"""
+    params = {"limit": 100} if after_id is None else {"limit": 500, "after_id": after_id}
     try:
-        response = requests.get(f"{BACKEND_URL}/iot/data?limit=100", timeout=5)
+        response = http_session().get(f"{BACKEND_URL}/iot/data", params=params, timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
-            return response.json()
+            return decode_json(response)
         return None
     except Exception as e:
         st.error(f"Error fetching IoT data: {e}")
         return None
 
+@st.cache_data(ttl=REFRESH_INTERVAL - 1, show_spinner=False)
 def fetch_alerts():
     """Fetch alerts from FastAPI backend"""
     try:
-        response = requests.get(f"{BACKEND_URL}/alerts?limit=50", timeout=5)
+        response = http_session().get(f"{BACKEND_URL}/alerts?limit=50", timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
-            return response.json()
+            return decode_json(response)
         return None
     except Exception as e:
         st.error(f"Error fetching alerts: {e}")
         return None
 
+@st.cache_data(ttl=REFRESH_INTERVAL - 1, show_spinner=False)
+def fetch_aggregate():
+    """Fetch bucketed temperature/humidity series from FastAPI backend"""
+    try:
+        response = http_session().get(f"{BACKEND_URL}/iot/aggregate", params={"bucket": CHART_BUCKET, "hours": CHART_HOURS}, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 200:
+            return decode_json(response)
+        return None
+    except Exception:
+        return None
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def series_frame(series):
+    """DataFrame of the aggregated buckets, ready to plot without further grouping"""
+    df = pd.DataFrame(series)
+    df['timestamp'] = pd.to_datetime(df['bucket'], format="ISO8601")
+    return df
+
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def readings_frame(readings):
+    """Sorted DataFrame of the fetched readings; reused while the payload is unchanged"""
+    df = pd.DataFrame(readings)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format="ISO8601")
+    return df.sort_values('timestamp')
+
+def downsample(df):
+    """Per-batch means over PLOT_RESAMPLE windows, so the charts carry one point per window"""
+    return (df.set_index('timestamp')
+              .groupby('batch_id')[['temperature', 'humidity']]
+              .resample(PLOT_RESAMPLE).mean()
+              .dropna()
+              .reset_index())
+
+def load_readings():
+    """Readings kept in this session, extended with only the rows stored since the last refresh"""
+    frame = st.session_state.get("iot_df")
+    iot_data = fetch_iot_data(st.session_state.get("iot_last_id"))
+    if iot_data is None:
+        st.session_state["consecutive_failures"] = st.session_state.get("consecutive_failures", 0) + 1
+        return frame
+    st.session_state["consecutive_failures"] = 0
+    if not iot_data.get("data"):
+        return frame
+    new_rows = readings_frame(iot_data["data"])
+    if frame is not None:
+        new_rows = pd.concat([frame, new_rows]).sort_values('timestamp').tail(MAX_READINGS)
+    st.session_state["iot_df"] = new_rows
+    st.session_state["iot_last_id"] = int(new_rows['id'].max())
+    return new_rows
+
+def refresh_interval():
+    """Seconds until the next rerun, backing off while the backend keeps failing"""
+    failures = st.session_state.get("consecutive_failures", 0)
+    if failures <= FAILURES_BEFORE_BACKOFF:
+        return REFRESH_INTERVAL
+    return min(REFRESH_INTERVAL * 2 ** (failures - FAILURES_BEFORE_BACKOFF), MAX_REFRESH_INTERVAL)
+
+# Auto-refresh: rerun the script every refresh_interval() seconds
+refresh_seconds = refresh_interval()
+st_autorefresh(interval=refresh_seconds * 1000, key="iot")
+
 # Title
 st.title("🌡️ Real-Time IoT Monitoring Dashboard")
 st.markdown("### Live Temperature & Humidity Tracking")
 
-# Auto-refresh
-placeholder = st.empty()
-
-# System logs
-system_logs = []
+# Fetch data
+df = load_readings()
+# The readings fetch doubles as a health check: while it fails, skip the other calls
+# rather than waiting out their timeouts too
+backend_up = st.session_state["consecutive_failures"] == 0
+alerts_data = fetch_alerts() if backend_up else None
+aggregate_data = fetch_aggregate() if backend_up else None
+if not backend_up and df is not None:
+    st.warning(f"⚠️ Backend unreachable - showing the last readings received, retrying in {refresh_seconds} seconds")
 
-while True:
-    with placeholder.container():
-        # Fetch data
-        iot_data = fetch_iot_data()
-        alerts_data = fetch_alerts()
+if df is not None and not df.empty:
+    
+    # Get latest reading
+    latest = df.iloc[-1]
+    
+    # === TOP SUMMARY SECTION ===
+    st.markdown("---")
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            label="🌡️ Latest Temperature",
+            value=f"{latest['temperature']:.2f}°C",
+            delta=f"{latest['temperature'] - 5:.2f}°C from target"
+        )
+    
+    with col2:
+        st.metric(
+            label="💧 Latest Humidity",
+            value=f"{latest['humidity']:.2f}%",
+            delta=f"{latest['humidity'] - 45:.2f}% from target"
+        )
+    
+    with col3:
+        st.metric(
+            label="📊 Total Records",
+            value=len(df),
+            delta=f"+{len(df) - 100} new" if len(df) > 100 else "0 new"
+        )
+    
+    with col4:
+        st.metric(
+            label="📍 Current Location",
+            value=latest['location'][:20],
+            delta=None
+        )
+    
+    st.markdown("---")
+    
+    # === LIVE GRAPHS ===
+    # Bucket averages when the backend serves them, otherwise the raw readings averaged locally
+    if aggregate_data and aggregate_data.get("series"):
+        chart_df, temp_col, humid_col = series_frame(aggregate_data["series"]), 'temperature_avg', 'humidity_avg'
+    else:
+        chart_df, temp_col, humid_col = downsample(df), 'temperature', 'humidity'
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.subheader("🌡️ Temperature vs Time")
+        fig_temp = px.line(chart_df, x='timestamp', y=temp_col, color='batch_id', markers=True)
+        fig_temp.update_traces(line=dict(width=2), marker=dict(size=6))
         
-        if iot_data and iot_data.get("data"):
-            df = pd.DataFrame(iot_data["data"])
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp')
-            
-            # Get latest reading
-            latest = df.iloc[-1]
-            
-            # === TOP SUMMARY SECTION ===
-            st.markdown("---")
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric(
-                    label="🌡️ Latest Temperature",
-                    value=f"{latest['temperature']:.2f}°C",
-                    delta=f"{latest['temperature'] - 5:.2f}°C from target"
-                )
-            
-            with col2:
-                st.metric(
-                    label="💧 Latest Humidity",
-                    value=f"{latest['humidity']:.2f}%",
-                    delta=f"{latest['humidity'] - 45:.2f}% from target"
-                )
-            
-            with col3:
-                st.metric(
-                    label="📊 Total Records",
-                    value=len(df),
-                    delta=f"+{len(df) - 100} new" if len(df) > 100 else "0 new"
-                )
-            
-            with col4:
-                st.metric(
-                    label="📍 Current Location",
-                    value=latest['location'][:20],
-                    delta=None
-                )
-            
-            st.markdown("---")
-            
-            # === LIVE GRAPHS ===
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("🌡️ Temperature vs Time")
-                fig_temp = go.Figure()
-                
-                # Plot temperature by batch
-                for batch_id in df['batch_id'].unique():
-                    batch_df = df[df['batch_id'] == batch_id]
-                    fig_temp.add_trace(go.Scatter(
-                        x=batch_df['timestamp'],
-                        y=batch_df['temperature'],
-                        mode='lines+markers',
-                        name=batch_id,
-                        line=dict(width=2),
-                        marker=dict(size=6)
-                    ))
-                
-                # Add safe range lines
-                fig_temp.add_hline(y=8, line_dash="dash", line_color="red", 
-                                  annotation_text="Max Safe (8°C)")
-                fig_temp.add_hline(y=2, line_dash="dash", line_color="blue", 
-                                  annotation_text="Min Safe (2°C)")
-                
-                fig_temp.update_layout(
-                    xaxis_title="Time",
-                    yaxis_title="Temperature (°C)",
-                    height=400,
-                    hovermode='x unified',
-                    showlegend=True
-                )
-                
-                st.plotly_chart(fig_temp, use_container_width=True)
-            
-            with col2:
-                st.subheader("💧 Humidity vs Time")
-                fig_humid = go.Figure()
-                
-                # Plot humidity by batch
-                for batch_id in df['batch_id'].unique():
-                    batch_df = df[df['batch_id'] == batch_id]
-                    fig_humid.add_trace(go.Scatter(
-                        x=batch_df['timestamp'],
-                        y=batch_df['humidity'],
-                        mode='lines+markers',
-                        name=batch_id,
-                        line=dict(width=2),
-                        marker=dict(size=6)
-                    ))
-                
-                fig_humid.update_layout(
-                    xaxis_title="Time",
-                    yaxis_title="Humidity (%)",
-                    height=400,
-                    hovermode='x unified',
-                    showlegend=True
-                )
-                
-                st.plotly_chart(fig_humid, use_container_width=True)
-            
-            st.markdown("---")
-            
-            # === ALERTS SECTION ===
-            col1, col2 = st.columns([2, 1])
-            
-            with col1:
-                st.subheader("⚠️ Active Alerts")
-                
-                if alerts_data and alerts_data.get("alerts"):
-                    alerts = alerts_data["alerts"]
-                    active_alerts = [a for a in alerts if not a.get('resolved', False)]
-                    
-                    if active_alerts:
-                        for alert in active_alerts[:5]:  # Show top 5
-                            severity = alert.get('severity', 'medium')
-                            alert_class = 'alert-high' if severity == 'high' else 'alert-medium'
-                            
-                            st.markdown(f"""
-                            <div class="{alert_class}">
-                                <strong>🚨 {alert['alert_type']}</strong><br>
-                                Batch: {alert['batch_id']} | Temp: {alert['temperature']}°C<br>
-                                Location: {alert['location']} | Time: {alert['timestamp'][:19]}<br>
-                                {alert['message']}
-                            </div>
-                            """, unsafe_allow_html=True)
-                    else:
-                        st.success("✅ All readings normal - No active alerts")
-                else:
-                    st.success("✅ All readings normal - No active alerts")
-            
-            with col2:
-                st.subheader("📋 System Logs")
-                
-                # Add log entries
-                current_time = datetime.now().strftime("%H:%M:%S")
-                
-                st.markdown(f"""
-                <div class="log-entry">
-                    <strong>[{current_time}]</strong> New data fetched<br>
-                    <small>Retrieved {len(df)} records</small>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                if alerts_data and alerts_data.get("alerts"):
-                    alert_count = len([a for a in alerts_data["alerts"] if not a.get('resolved', False)])
-                    if alert_count > 0:
-                        st.markdown(f"""
-                        <div class="log-entry">
-                            <strong>[{current_time}]</strong> Alert detected<br>
-                            <small>{alert_count} active alerts</small>
-                        </div>
-                        """, unsafe_allow_html=True)
-                
-                st.markdown(f"""
-                <div class="log-entry">
-                    <strong>[{current_time}]</strong> Offline data uploaded<br>
-                    <small>Sync complete</small>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.markdown(f"""
-                <div class="log-entry">
-                    <strong>[{current_time}]</strong> System healthy<br>
-                    <small>All sensors online</small>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            st.markdown("---")
-            
-            # === DATA TABLE ===
-            st.subheader("📊 Recent IoT Readings")
-            display_df = df[['timestamp', 'batch_id', 'temperature', 'humidity', 'location', 'sensor_id']].tail(20)
-            st.dataframe(display_df, use_container_width=True, height=300)
-            
-            # === FOOTER ===
-            st.markdown("---")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.info(f"🔄 Auto-refresh: Every {REFRESH_INTERVAL} seconds")
-            with col2:
-                st.info(f"🕐 Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            with col3:
-                st.info(f"🔗 Backend: {BACKEND_URL}")
+        # Add safe range lines
+        fig_temp.add_hline(y=8, line_dash="dash", line_color="red", 
+                          annotation_text="Max Safe (8°C)")
+        fig_temp.add_hline(y=2, line_dash="dash", line_color="blue", 
+                          annotation_text="Min Safe (2°C)")
+        
+        fig_temp.update_layout(
+            xaxis_title="Time",
+            yaxis_title="Temperature (°C)",
+            height=400,
+            hovermode='x unified',
+            showlegend=True
+        )
+        
+        st.plotly_chart(fig_temp, use_container_width=True)
+    
+    with col2:
+        st.subheader("💧 Humidity vs Time")
+        fig_humid = px.line(chart_df, x='timestamp', y=humid_col, color='batch_id', markers=True)
+        fig_humid.update_traces(line=dict(width=2), marker=dict(size=6))
+        
+        fig_humid.update_layout(
+            xaxis_title="Time",
+            yaxis_title="Humidity (%)",
+            height=400,
+            hovermode='x unified',
+            showlegend=True
+        )
         
+        st.plotly_chart(fig_humid, use_container_width=True)
+    
+    st.markdown("---")
+    
+    # === ALERTS SECTION ===
+    col1, col2 = st.columns([2, 1])
+    active_alerts = [a for a in alerts_data["alerts"] if not a.get('resolved', False)] if alerts_data and alerts_data.get("alerts") else []
+    
+    with col1:
+        st.subheader("⚠️ Active Alerts")
+        
+        if active_alerts:
+            # One markdown element for all cards instead of one per alert
+            st.markdown("".join(
+                ALERT_CARD.format(
+                    alert_class='alert-high' if alert.get('severity', 'medium') == 'high' else 'alert-medium',
+                    alert_type=alert['alert_type'],
+                    batch_id=alert['batch_id'],
+                    temperature=alert['temperature'],
+                    location=alert['location'],
+                    time=alert['timestamp'][:19],
+                    message=alert['message']
+                )
+                for alert in active_alerts[:5]  # Show top 5
+            ), unsafe_allow_html=True)
         else:
-            st.error("❌ Unable to fetch IoT data from backend")
-            st.info("Make sure the FastAPI backend is running on http://localhost:8000")
+            st.success("✅ All readings normal - No active alerts")
+    
+    with col2:
+        st.subheader("📋 System Logs")
+        
+        # Add log entries
+        current_time = datetime.now().strftime("%H:%M:%S")
+        
+        log_entries = [("New data fetched", f"Retrieved {len(df)} records")]
+        if active_alerts:
+            log_entries.append(("Alert detected", f"{len(active_alerts)} active alerts"))
+        log_entries.append(("Offline data uploaded", "Sync complete"))
+        log_entries.append(("System healthy", "All sensors online"))
+        
+        st.markdown("".join(LOG_ENTRY.format(time=current_time, title=title, detail=detail) for title, detail in log_entries), unsafe_allow_html=True)
     
-    # Wait before refresh
-    time.sleep(REFRESH_INTERVAL)
-    placeholder.empty()
+    st.markdown("---")
+    
+    # === DATA TABLE ===
+    st.subheader("📊 Recent IoT Readings")
+    display_df = df[['timestamp', 'batch_id', 'temperature', 'humidity', 'location', 'sensor_id']].tail(20)
+    st.dataframe(display_df, use_container_width=True, height=300)
+    
+    # === FOOTER ===
+    st.markdown("---")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.info(f"🔄 Auto-refresh: Every {refresh_seconds} seconds")
+    with col2:
+        st.info(f"🕐 Last updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    with col3:
+        st.info(f"🔗 Backend: {BACKEND_URL}")
+
+else:
+    st.error("❌ Unable to fetch IoT data from backend")
+    st.info("Make sure the FastAPI backend is running on http://localhost:8000")
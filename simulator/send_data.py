@@ -1,44 +1,68 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import os
+import numpy as np
 import random
+import threading
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 
 BACKEND_URL = "http://localhost:8000"
 
 BATCH_IDS = ["BATCH-2025-001", "BATCH-2025-002", "BATCH-2025-003", "BATCH-2025-004"]
 SENSOR_IDS = ["SENSOR-001", "SENSOR-002", "SENSOR-003", "SENSOR-004", "SENSOR-005"]
 
-def generate_sensor_reading():
-    normal_temp_range = (4.0, 6.0)
-    
-    if random.random() < 0.15:
-        temperature = round(random.uniform(-2.0, 12.0), 2)
-    else:
-        temperature = round(random.uniform(*normal_temp_range), 2)
-    
-    humidity = round(random.uniform(30.0, 70.0), 2)
-    
-    data = {
-        "batch_id": random.choice(BATCH_IDS),
-        "temperature": temperature,
-        "humidity": humidity,
-        "location": "Auto-Detected",  # Backend will fetch real location using Google Geolocation API
-        "sensor_id": random.choice(SENSOR_IDS),
-        "timestamp": datetime.utcnow().isoformat()
-    }
+# Readings generated per iteration and sent together to /iot/data/bulk
+BATCH_SIZE = 16
+# Independent send loops, each standing in for a group of devices; they share SESSION's pool.
+# One by default; raise SIMULATOR_SENDERS to load-test the backend
+SENDERS = int(os.getenv("SIMULATOR_SENDERS", "1"))
+
+# One keep-alive session for the whole run so each reading reuses the open connection
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=max(8, SENDERS), max_retries=Retry(total=2, backoff_factor=0.2)))
+
+RNG = np.random.default_rng()
+BATCH_ID_ARRAY = np.array(BATCH_IDS)
+SENSOR_ID_ARRAY = np.array(SENSOR_IDS)
+
+def generate_batch(n=BATCH_SIZE):
+    """n readings drawn in one pass: mostly 4-6°C, with ~15% excursions between -2 and 12°C"""
+    excursion = RNG.random(n) < 0.15
+    temperatures = np.where(excursion, RNG.uniform(-2.0, 12.0, n), RNG.uniform(4.0, 6.0, n)).round(2)
+    humidities = RNG.uniform(30.0, 70.0, n).round(2)
+    batch_ids = RNG.choice(BATCH_ID_ARRAY, n)
+    sensor_ids = RNG.choice(SENSOR_ID_ARRAY, n)
     
-    return data
+    return [
+        {
+            "batch_id": batch_id,
+            "temperature": temperature,
+            "humidity": humidity,
+            "location": "Auto-Detected",  # Backend will fetch real location using Google Geolocation API
+            "sensor_id": sensor_id,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+        for batch_id, temperature, humidity, sensor_id in zip(batch_ids.tolist(), temperatures.tolist(), humidities.tolist(), sensor_ids.tolist())
+    ]
+
+def generate_sensor_reading():
+    return generate_batch(1)[0]
 
 def send_iot_data():
     try:
-        data = generate_sensor_reading()
+        batch = generate_batch()
         
-        response = requests.post(f"{BACKEND_URL}/iot/data", json=data, timeout=10)
+        response = SESSION.post(f"{BACKEND_URL}/iot/data/bulk", json=batch, timeout=10)
         
         if response.status_code == 200:
             result = response.json()
-            alert_status = "⚠️ ALERT" if result.get("alert_generated") else "✓ Normal"
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] {alert_status} | Batch: {data['batch_id']} | Temp: {data['temperature']}°C | Humidity: {data['humidity']}% | Location: {data['location']}")
+            now = datetime.now().strftime('%H:%M:%S')
+            for data, is_alert in zip(batch, result.get("alert_flags", [])):
+                alert_status = "⚠️ ALERT" if is_alert else "✓ Normal"
+                print(f"[{now}] {alert_status} | Batch: {data['batch_id']} | Temp: {data['temperature']}°C | Humidity: {data['humidity']}% | Location: {data['location']}")
+            print(f"Sent {result.get('count', len(batch))} readings, {result.get('alerts_generated', 0)} alerts")
             return True
         else:
             print(f"Error: {response.status_code} - {response.text}")
@@ -57,18 +81,26 @@ def main():
     print("=" * 80)
     print(f"Backend URL: {BACKEND_URL}")
     print(f"Monitoring Batches: {', '.join(BATCH_IDS)}")
+    print(f"Senders: {SENDERS} x {BATCH_SIZE} readings per request")
     print(f"Safe Temperature Range: 2°C - 8°C")
     print("=" * 80)
     print()
     
+    # Sender 0 runs on the main thread so Ctrl+C still stops the simulator;
+    # the daemon threads exit with it
+    for sender in range(1, SENDERS):
+        threading.Thread(target=run_sender, args=(sender,), name=f"sender-{sender}", daemon=True).start()
+    run_sender(0)
+
+def run_sender(sender):
     iteration = 0
     while True:
         iteration += 1
-        print(f"\n--- Iteration {iteration} ---")
+        print(f"\n--- Sender {sender} | Iteration {iteration} ---")
         send_iot_data()
         
         interval = random.uniform(3, 7)
-        print(f"Next reading in {interval:.1f} seconds...")
+        print(f"Sender {sender}: next readings in {interval:.1f} seconds...")
         time.sleep(interval)
 
 if __name__ == "__main__":
@@ -5,6 +5,7 @@ import requests
 import time
 
 BACKEND_URL = "http://localhost:8000"
+SESSION = requests.Session()
 
 print("=" * 70)
 print("Testing Audit Logging")
@@ -13,7 +14,7 @@ print("=" * 70)
 # Test 1: Create a test audit log
 print("\n1. Creating test audit log...")
 try:
-    response = requests.post(f"{BACKEND_URL}/audit/log", 
+    response = SESSION.post(f"{BACKEND_URL}/audit/log", 
                            json={
                                "user_email": "test@pharmachain.com",
                                "role": "FDA",
@@ -35,7 +36,7 @@ time.sleep(1)
 # Test 2: Retrieve audit logs
 print("\n2. Retrieving audit logs...")
 try:
-    response = requests.get(f"{BACKEND_URL}/audit/logs?limit=10", timeout=10)
+    response = SESSION.get(f"{BACKEND_URL}/audit/logs?limit=10", timeout=10)
     
     if response.status_code == 200:
         result = response.json()
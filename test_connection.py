@@ -4,6 +4,7 @@ Test Supabase connection and check if tables exist
 from supabase import create_client
 from dotenv import load_dotenv
 import os
+from db_tables import probe_tables
 
 load_dotenv()
 
@@ -18,26 +19,28 @@ try:
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
     print("✅ Connection successful!")
     
+    # Which tables exist, in one query when public_tables() is installed
+    # (user_profiles is read below anyway, which doubles as its check)
+    tables = probe_tables(supabase, ["iot_data", "alerts"])
+    
     # Test iot_data table
     print("\n📊 Testing iot_data table...")
-    try:
-        result = supabase.table("iot_data").select("*").limit(1).execute()
-        print(f"✅ iot_data table exists! Records: {len(result.data)}")
-    except Exception as e:
-        print(f"❌ iot_data table error: {str(e)}")
+    if tables["iot_data"] is None:
+        print("✅ iot_data table exists!")
+    else:
+        print(f"❌ iot_data table error: {tables['iot_data']}")
     
     # Test alerts table
     print("\n⚠️  Testing alerts table...")
-    try:
-        result = supabase.table("alerts").select("*").limit(1).execute()
-        print(f"✅ alerts table exists! Records: {len(result.data)}")
-    except Exception as e:
-        print(f"❌ alerts table error: {str(e)}")
+    if tables["alerts"] is None:
+        print("✅ alerts table exists!")
+    else:
+        print(f"❌ alerts table error: {tables['alerts']}")
     
     # Test user_profiles table
     print("\n👤 Testing user_profiles table...")
     try:
-        result = supabase.table("user_profiles").select("*").limit(5).execute()
+        result = supabase.table("user_profiles").select("email, role").limit(5).execute()
         print(f"✅ user_profiles table exists! Users: {len(result.data)}")
         for user in result.data:
             print(f"   - {user['email']} ({user['role']})")
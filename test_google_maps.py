@@ -9,6 +9,7 @@ load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 BACKEND_URL = "http://localhost:8000"
+SESSION = requests.Session()
 
 print("=" * 70)
 print("Testing Google Maps Integration")
@@ -35,7 +36,7 @@ print(f"\n✅ Google API Key found: {GOOGLE_API_KEY[:20]}...")
 # Test 1: Backend health check
 print("\n1. Testing backend health...")
 try:
-    response = requests.get(f"{BACKEND_URL}/health", timeout=5)
+    response = SESSION.get(f"{BACKEND_URL}/health", timeout=5)
     if response.status_code == 200:
         health = response.json()
         print(f"✅ Backend: {health['status']}")
@@ -49,7 +50,7 @@ except Exception as e:
 # Test 2: Geocoding API
 print("\n2. Testing Geocoding API...")
 try:
-    response = requests.get(f"{BACKEND_URL}/geocode?address=Mumbai, India", timeout=10)
+    response = SESSION.get(f"{BACKEND_URL}/geocode?address=Mumbai, India", timeout=10)
     if response.status_code == 200:
         result = response.json()
         print(f"✅ Geocoding works!")
@@ -63,7 +64,7 @@ except Exception as e:
 # Test 3: Directions API
 print("\n3. Testing Directions API...")
 try:
-    response = requests.get(f"{BACKEND_URL}/route?origin=Chennai&destination=Bengaluru", timeout=10)
+    response = SESSION.get(f"{BACKEND_URL}/route?origin=Chennai&destination=Bengaluru", timeout=10)
     if response.status_code == 200:
         result = response.json()
         if result["status"] == "success" and result["route"].get("routes"):
@@ -90,7 +91,7 @@ try:
         "timestamp": "2025-11-07T00:00:00Z"
     }
     
-    response = requests.post(f"{BACKEND_URL}/iot/data", json=test_data, timeout=10)
+    response = SESSION.post(f"{BACKEND_URL}/iot/data", json=test_data, timeout=10)
     if response.status_code == 200:
         result = response.json()
         print(f"✅ IoT data processed!")
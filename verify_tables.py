@@ -2,10 +2,15 @@
 Verify all tables exist and check their status
 """
 from supabase import create_client
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-load_dotenv()
+# Containers and CI pass the credentials in the environment; only read .env when they are absent
+if not (os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY")):
+    load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
@@ -14,7 +19,7 @@ print("=" * 70)
 print("PharmaChain Database Tables Verification")
 print("=" * 70)
 
-tables_to_check = [
+TABLES_TO_CHECK = (
     ("iot_data", "IoT sensor readings"),
     ("alerts", "Temperature alerts"),
     ("batches", "Batch information"),
@@ -25,26 +30,54 @@ tables_to_check = [
     ("shipments", "Shipment tracking"),
     ("signatures", "Multi-party signatures (optional)"),
     ("vehicle_telemetry", "Vehicle health (optional)")
-]
+)
+TABLE_NAMES = [table_name for table_name, _ in TABLES_TO_CHECK]
+# PostgREST error codes for an unknown table (PGRST205 since v12, 42P01 before)
+MISSING_TABLE_CODES = ("PGRST205", "42P01")
+# Fallback probes in flight at once, kept small so a shared project is not flooded
+PROBE_CONCURRENCY = 5
 
 try:
     supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
     print("\n✅ Connected to Supabase\n")
     
-    for table_name, description in tables_to_check:
+    def count_rows(table_name):
+        """(count, None) for an existing table, (None, None) for a missing one, or (None, error)"""
         try:
-            result = supabase.table(table_name).select("*").limit(1).execute()
-            count_result = supabase.table(table_name).select("id", count="exact").execute()
-            count = count_result.count if hasattr(count_result, 'count') else len(result.data)
-            
-            status = "✅" if count > 0 else "⚪"
-            print(f"{status} {table_name:20} - {description:40} ({count} records)")
-            
+            # HEAD request: the count comes back in Content-Range, with no rows. "estimated"
+            # is exact up to PostgREST's max-rows and the planner estimate above it, so
+            # large tables are not scanned just to print a record count
+            count_result = supabase.table(table_name).select("id", count="estimated", head=True).execute()
+            return count_result.count or 0, None
+        except APIError as e:
+            if e.code in MISSING_TABLE_CODES:
+                return None, None
+            return None, e
         except Exception as e:
-            if "PGRST205" in str(e) or "Could not find" in str(e):
-                print(f"❌ {table_name:20} - Table does not exist")
-            else:
-                print(f"⚠️  {table_name:20} - Error: {str(e)[:50]}")
+            return None, e
+    
+    try:
+        # Every table in one call (create_table_row_counts_function.sql)
+        rows = supabase.rpc("table_row_counts", {"names": TABLE_NAMES}).execute().data
+        counts = {row["table_name"]: row["row_count"] if row["table_exists"] else None for row in rows}
+        results = [(counts.get(table_name), None) for table_name in TABLE_NAMES]
+    except Exception:
+        # Function not installed - the probes are independent, so run them side by side
+        with ThreadPoolExecutor(max_workers=PROBE_CONCURRENCY) as executor:
+            results = list(executor.map(count_rows, TABLE_NAMES))
+    
+    # Build the report and write it in one go, so it is not interleaved with other output
+    lines = []
+    for (table_name, description), (count, e) in zip(TABLES_TO_CHECK, results):
+        if e is not None:
+            lines.append(f"⚠️  {table_name:20} - Error: {str(e)[:50]}")
+        elif count is None:
+            lines.append(f"❌ {table_name:20} - Table does not exist")
+        else:
+            status = "✅" if count > 0 else "⚪"
+            lines.append(f"{status} {table_name:20} - {description:40} ({count} records)")
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
     
     print("\n" + "=" * 70)
     print("Legend:")